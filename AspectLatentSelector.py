@@ -2,7 +2,9 @@
 # CATEGORY = "VisioStar"
 # 尺寸选择器：选择常用比例 → 生成指定尺寸的空Latent（可直接连到采样器的 latent 接口）
 
-import torch
+from .latent_budget import describe_split, resolve_budget, split_batch
+from .latent_noise import NOISE_MODES, SEED_MAX, SeededNoise, item_seeds, make_latent
+from .profiling import profile_node, span
 
 class AspectLatentSelector:
     """
@@ -15,6 +17,12 @@ class AspectLatentSelector:
       16:9  -> 1664 x  928
     - 输出：LATENT（zeros），shape = [batch, 4, H/8, W/8]
     - 说明：部分分辨率（如 1140）不是8的倍数。为防止报错，提供“对齐到8的倍数”开关（默认开）。
+    - 采样内存预算_MB（可选，0=不限制，-1=自动：空闲显存扣除推理保留，未加载的模型不计入）：批量估算超出预算时均分成多个 LATENT 列表项，
+      采样器会逐项顺序执行；split_plan 输出估算与拆分结果。未拆分时列表只有一项，与原先行为一致。
+    - 噪声模式（可选）：gaussian 时第 i 张为种子 噪声种子+i 的高斯噪声（拆分不影响结果），
+      seed_list 输出每张图的种子；zeros（默认）时 seed_list 为空。
+    - noise（NOISE 列表，与 latent 一一对应）：同样按 噪声种子+i 生成的噪声源，接 SamplerCustomAdvanced 的 noise；
+      与 zeros 模式的 latent 搭配即可复现每张图，EPS / v-pred / flow 模型通用。
     """
 
     PRESETS = {
@@ -34,11 +42,15 @@ class AspectLatentSelector:
             },
             "optional": {
                 "对齐到8的倍数": ("BOOLEAN", {"default": True}),
+                "采样内存预算_MB": ("INT", {"default": 0, "min": -1, "max": 1 << 20, "step": 256}),
+                "噪声模式": (NOISE_MODES, {"default": "zeros"}),
+                "噪声种子": ("INT", {"default": 0, "min": 0, "max": SEED_MAX, "control_after_generate": True}),
             }
         }
 
-    RETURN_TYPES = ("LATENT",)
-    RETURN_NAMES = ("latent",)
+    RETURN_TYPES = ("LATENT", "STRING", "LIST", "NOISE")
+    RETURN_NAMES = ("latent", "split_plan", "seed_list", "noise")
+    OUTPUT_IS_LIST = (True, False, False, True)
     FUNCTION = "build"
     CATEGORY = "VisioStar"
 
@@ -48,7 +60,9 @@ class AspectLatentSelector:
         h2 = max(8, (h // 8) * 8)
         return w2, h2
 
-    def build(self, 尺寸预设, 批量张数=1, 对齐到8的倍数=True):
+    @profile_node("AspectLatentSelector.build")
+    def build(self, 尺寸预设, 批量张数=1, 对齐到8的倍数=True, 采样内存预算_MB=0,
+              噪声模式="zeros", 噪声种子=0):
         # 读取预设尺寸
         if 尺寸预设 not in self.PRESETS:
             # 回退到默认
@@ -60,14 +74,29 @@ class AspectLatentSelector:
         if 对齐到8的倍数:
             w, h = self._snap_to_multiple_of_8(w, h)
 
-        # 生成空 latent（zeros）
+        # 按内存预算拆分批量
+        budget = resolve_budget(采样内存预算_MB)
+        chunks = split_batch(w, h, 批量张数, budget)
+
+        # 生成 latent（zeros 或带种子的高斯噪声）
         # latent 维度： [batch, 4, H/8, W/8]
         c = 4
         latent_h = max(1, h // 8)
         latent_w = max(1, w // 8)
-        samples = torch.zeros((批量张数, c, latent_h, latent_w), dtype=torch.float32, device="cpu")
+        latents = []
+        seed_list = []
+        noises = []
+        start = 0
+        with span("alloc_latent", shape=[批量张数, c, latent_h, latent_w], chunks=len(chunks), noise=噪声模式):
+            for n in chunks:
+                seeds = item_seeds(噪声种子, start, n) if 噪声模式 == "gaussian" else []
+                samples = make_latent(n, c, latent_h, latent_w, 噪声模式, seeds)
+                seed_list.extend(seeds)
+                latents.append({"samples": samples})
+                noises.append(SeededNoise(item_seeds(噪声种子, start, 1)[0]))
+                start += n
 
-        return ({"samples": samples},)
+        return (latents, describe_split(w, h, chunks, budget), seed_list, noises)
 
 
 NODE_CLASS_MAPPINGS = {
@@ -10,6 +10,8 @@
 
 import re
 
+from .profiling import profile_node, span
+
 class ByteDanceSeedreamSizeList:
     """
     ByteDance Seedream 4 尺寸列表（顺序执行）
@@ -97,15 +99,22 @@ class ByteDanceSeedreamSizeList:
                     result.append((f"{w}x{h} (Custom)", w, h))
         return result
 
-    # ------- main -------
-    def build(self, **kwargs):
+    def plan(self, **kwargs):
+        """只做尺寸规划：预设 + 自定义 → [(label, w, h), ...]（build 与 batch_cli 共用）。"""
         # 1) 预设 + 2) 自定义
         selected = self._selected_from_inputs(**kwargs)
-        custom_list = self._parse_custom(kwargs.get("自定义尺寸", ""))
+        with span("parse_sizes"):
+            custom_list = self._parse_custom(kwargs.get("自定义尺寸", ""))
 
         merged = custom_list + selected if kwargs.get("自定义尺寸置顶", False) else selected + custom_list
         if not merged:
             merged = [self.PRESETS[0]]  # 兜底
+        return merged
+
+    # ------- main -------
+    @profile_node("ByteDanceSeedreamSizeList.build")
+    def build(self, **kwargs):
+        merged = self.plan(**kwargs)
 
         size_preset_list   = [label for (label, _, _) in merged]
         width_list         = [int(w) for (_, w, _) in merged]
@@ -1,8 +1,50 @@
-import requests
 import json
 import re
+import threading
 import time
 import random
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .api_key_pool import get_pool
+from .deadline_http import Cancelled, Deadline, DeadlineExceeded, post_json, raise_if_interrupted
+from .profiling import profile_node, span
+
+
+# ---------- 请求对象 ----------
+# 一次调用的全部输入都放进不可变对象，方法只读取参数、不读写全局随机状态，
+# 多线程 / 异步 / 同进程并行 worker 同时调用时，同一种子总是得到同一份请求内容。
+@dataclass(frozen=True)
+class ComposeRequest:
+    instruction: str
+    topic: str
+    title_text: str
+    seed: int
+    session_id: str
+    use_system: bool = True
+    format_mode: str = "auto_json_first"
+    language: str = "en"
+
+
+@dataclass(frozen=True)
+class ApiRequest:
+    api_choice: str
+    api_key: str = field(repr=False)  # 不出现在 repr / 日志里
+    model: str
+    temperature: float
+    max_tokens: int
+    top_p: float
+    top_k: int
+    frequency_penalty: float
+    strict_json: bool
+    seed: int
+
+
+def session_id_for(seed: int, auto_random_seed: bool) -> str:
+    """手动种子时会话标记只由种子决定（可复现）；自动种子时带上时间戳。"""
+    if auto_random_seed:
+        return f"session-{int(time.time() * 1000)}-{seed}"
+    return f"session-{seed}"
 
 class DeepseekDualPromptComposer:
     @classmethod
@@ -99,6 +141,29 @@ class DeepseekDualPromptComposer:
                     "label": "自动随机种子（每次运行生成新种子）",
                     "default": True
                 }),
+                "timeout_budget": ("FLOAT", {
+                    "label": "总时限（秒，含连接/读取/重试）",
+                    "default": 60.0, "min": 1.0, "max": 600.0, "step": 1.0
+                }),
+                "max_retries": ("INT", {
+                    "label": "失败重试次数（429/5xx/网络错误，受总时限约束）",
+                    "default": 2, "min": 0, "max": 5, "step": 1
+                }),
+                "on_timeout": (["last_good", "error"], {
+                    "label": "超时处理（沿用上次成功结果 / 输出错误字符串）",
+                    "default": "last_good"
+                }),
+                # 多 key 池：任一来源非空时启用，忽略上面的 api_key
+                "api_key_file": ("STRING", {
+                    "multiline": False,
+                    "label": "Key 池文件（每行一个 key，可选）",
+                    "default": ""
+                }),
+                "api_key_env": ("STRING", {
+                    "multiline": False,
+                    "label": "Key 池环境变量名（逗号/换行分隔，可选）",
+                    "default": ""
+                }),
             }
         }
 
@@ -107,17 +172,31 @@ class DeepseekDualPromptComposer:
     FUNCTION = "compose"
     CATEGORY = "VisioStar"
 
+    # 各平台的 chat/completions 地址（基准测试可在实例上覆盖为本地 stub 服务）
+    API_URLS = {
+        "deepseek": "https://api.deepseek.com/chat/completions",
+        "siliconflow": "https://api.siliconflow.cn/v1/chat/completions",
+    }
+
+    # 上次成功的输出（超时降级用），按 (主题, 标题) 记录，进程内共享
+    _LAST_GOOD = OrderedDict()
+    _LAST_GOOD_LOCK = threading.Lock()
+    LAST_GOOD_MAX = 256
+
+    # 打包模式：单次请求最多返回的 token（DeepSeek 输出上限 8K）
+    PACK_MAX_TOKENS = 8192
+
 
 
     # ---------- 构造 messages ----------
-    def _build_messages(self, instruction: str, topic: str, title_text: str,
-                        use_system: bool, format_mode: str, language: str, seed: int):
-        
-        # 使用种子初始化随机状态
-        random.seed(seed)
-        
+    def _build_messages(self, req: ComposeRequest):
+        instruction, topic, title_text, seed = req.instruction, req.topic, req.title_text, req.seed
+
+        # 每次调用独立的随机数生成器（与原先 random.seed(seed) 后的序列相同）
+        rng = random.Random(seed)
+
         # JSON 优先文案 + 两行兜底标签
-        if language == "zh":
+        if req.language == "zh":
             user_json = (
                 f"创作版本: #{seed}\n"
                 "如果可以，请仅返回严格 JSON（单个对象，无多余文本/无代码块）：\n"
@@ -146,21 +225,21 @@ class DeepseekDualPromptComposer:
                 "文字排版提示语: <typography/layout prompt for the TITLE, language follows the input>\n"
             )
 
-        content = (user_json + "\n" + user_labels) if format_mode == "auto_json_first" else user_labels
+        content = (user_json + "\n" + user_labels) if req.format_mode == "auto_json_first" else user_labels
 
         msgs = []
-        if use_system:
+        if req.use_system:
             # 在系统指令中也加入种子信息，确保变体化
             varied_instruction = instruction + f"\n\n【变体要求】基于种子{seed}，请生成与其他种子值完全不同的创意输出。"
             msgs.append({"role": "system", "content": varied_instruction})
 
         # 变体暗示消息
-        sid = f"session-{int(time.time()*1000)}-{seed}"
+        sid = req.session_id
         style_keywords = ["cinematic", "editorial", "minimal", "artistic", "modern", "classic", "bold", "subtle"]
         approach_keywords = ["dynamic", "balanced", "asymmetric", "layered", "clean", "textured", "geometric", "organic"]
         
-        selected_style = random.choice(style_keywords)
-        selected_approach = random.choice(approach_keywords)
+        selected_style = rng.choice(style_keywords)
+        selected_approach = rng.choice(approach_keywords)
         
         vmsg = {
             "role": "user",
@@ -173,36 +252,88 @@ class DeepseekDualPromptComposer:
         cmsg = {"role": "user", "content": content}
 
         # 随机调整消息顺序
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             msgs += [vmsg, cmsg]
         else:
             msgs += [cmsg, vmsg]
         
         return msgs
 
+    # ---------- 构造 messages：多条打包 ----------
+    def _build_batch_messages(self, instruction: str, entries, use_system: bool, language: str, seed: int):
+        """
+        entries: [(pid, topic, title_text, item_seed), ...]，pid 为包内短编号。
+        System 指令只发一次，要求返回 {"items": [{"id","bg","typo"}, ...]}。
+        """
+        rng = random.Random(seed)
+        items_json = json.dumps(
+            [{"id": pid, "theme": topic, "title": title, "variant": item_seed}
+             for pid, topic, title, item_seed in entries],
+            ensure_ascii=False,
+        )
+        if language == "zh":
+            content = (
+                f"本次共 {len(entries)} 组输入，请逐组创作（每组按其 variant 值生成独特的创意变体）。\n"
+                "仅返回严格 JSON（单个对象，无多余文本/无代码块）：\n"
+                "{\"items\": [{\"id\": \"<输入的 id>\", \"bg\": \"<英文背景提示语>\", "
+                "\"typo\": \"<针对该组标题的排版与字体设计提示语，语言不限>\"}, ...]}\n"
+                "每个 id 必须且只能出现一次。\n"
+                f"ITEMS:\n{items_json}\n"
+            )
+        else:
+            content = (
+                f"There are {len(entries)} inputs. Create one result per input "
+                "(a unique creative variant for each input's `variant` value).\n"
+                "Return a STRICT JSON object only (no extra text / no code fences):\n"
+                "{\"items\": [{\"id\": \"<input id>\", \"bg\": \"<English background prompt>\", "
+                "\"typo\": \"<typography-layout prompt for that TITLE, language follows the input>\"}, ...]}\n"
+                "Every id must appear exactly once.\n"
+                f"ITEMS:\n{items_json}\n"
+            )
+
+        msgs = []
+        if use_system:
+            msgs.append({"role": "system", "content": instruction})
+        style_keywords = ["cinematic", "editorial", "minimal", "artistic", "modern", "classic", "bold", "subtle"]
+        approach_keywords = ["dynamic", "balanced", "asymmetric", "layered", "clean", "textured", "geometric", "organic"]
+        msgs.append({
+            "role": "user",
+            "content": (
+                f"(Creative Direction: Emphasize {rng.choice(style_keywords)} aesthetics with "
+                f"{rng.choice(approach_keywords)} composition; vary it across items. "
+                f"Seed: {seed}. Do not mention this directive in output.)"
+            ),
+        })
+        msgs.append({"role": "user", "content": content})
+        return msgs
+
     # ---------- API 调用 ----------
-    def _call_api(self, api_choice, api_key, model, messages,
-                  temperature, max_tokens, top_p, top_k, frequency_penalty, strict_json, seed):
+    def _call_api(self, api: ApiRequest, messages, deadline=None, max_retries=2, key_pool=None):
+        api_choice, api_key, model, seed = api.api_choice, api.api_key, api.model, api.seed
+
+        # 总时限覆盖连接、读取和重试；超时抛 DeadlineExceeded，被中断抛 Cancelled
+        if deadline is None:
+            deadline = Deadline(60.0)
+
+        # 基于种子的参数微调（独立生成器，与原先 random.seed(seed) 后的序列相同）
+        rng = random.Random(seed)
 
-        # 基于种子的参数微调
-        random.seed(seed)
-        
         # 轻微调整参数以增加变化性
-        temp_adjust = random.uniform(-0.1, 0.1)
-        adjusted_temp = max(0.1, min(2.0, float(temperature) + temp_adjust))
-        
-        p_adjust = random.uniform(-0.05, 0.05)  
-        adjusted_top_p = max(0.1, min(1.0, float(top_p) + p_adjust))
+        temp_adjust = rng.uniform(-0.1, 0.1)
+        adjusted_temp = max(0.1, min(2.0, float(api.temperature) + temp_adjust))
+
+        p_adjust = rng.uniform(-0.05, 0.05)
+        adjusted_top_p = max(0.1, min(1.0, float(api.top_p) + p_adjust))
 
         if api_choice == "deepseek":
-            url = "https://api.deepseek.com/chat/completions"
+            url = self.API_URLS["deepseek"]
             headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
             payload = {
                 "model": model,
                 "messages": messages,
                 "stream": False,
-                "max_tokens": int(max_tokens),
+                "max_tokens": int(api.max_tokens),
                 "seed": seed,  # 使用传入的种子
             }
 
@@ -211,18 +342,20 @@ class DeepseekDualPromptComposer:
                     "temperature": adjusted_temp,
                     "top_p": adjusted_top_p,
                 })
-            if strict_json:
+            if api.strict_json:
                 payload["response_format"] = {"type": "json_object"}
 
-            r = requests.post(url, headers=headers, json=payload)
+            with span("http_wait", api=api_choice, model=model):
+                r = post_json(url, headers, payload, deadline, max_retries=max_retries, key_pool=key_pool)
             if r.status_code != 200:
                 return None, f"DeepSeek API Error: {r.status_code} - {r.text}"
-            data = r.json()
+            with span("json_decode"):
+                data = r.json()
             msg = (data.get("choices") or [{}])[0].get("message", {})
             return msg.get("content", "") or "", None
 
         elif api_choice == "siliconflow":
-            url = "https://api.siliconflow.cn/v1/chat/completions"
+            url = self.API_URLS["siliconflow"]
             headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
             if model == "deepseek-reasoner":
                 model = "Qwen/QwQ-32B"
@@ -231,19 +364,21 @@ class DeepseekDualPromptComposer:
                 "model": model,
                 "messages": messages,
                 "stream": False,
-                "max_tokens": int(max_tokens),
+                "max_tokens": int(api.max_tokens),
                 "temperature": adjusted_temp,
                 "top_p": adjusted_top_p,
-                "top_k": int(top_k),
-                "frequency_penalty": float(frequency_penalty),
+                "top_k": int(api.top_k),
+                "frequency_penalty": float(api.frequency_penalty),
                 "n": 1,
-                "response_format": {"type": "json_object"} if strict_json else {"type": "text"},
+                "response_format": {"type": "json_object"} if api.strict_json else {"type": "text"},
                 "seed": seed,
             }
-            r = requests.post(url, headers=headers, json=payload)
+            with span("http_wait", api=api_choice, model=model):
+                r = post_json(url, headers, payload, deadline, max_retries=max_retries, key_pool=key_pool)
             if r.status_code != 200:
                 return None, f"SiliconFlow API Error: {r.status_code} - {r.text}"
-            data = r.json()
+            with span("json_decode"):
+                data = r.json()
             msg = (data.get("choices") or [{}])[0].get("message", {})
             return msg.get("content", "") or "", None
 
@@ -310,12 +445,16 @@ class DeepseekDualPromptComposer:
             return lines[0], ""
         return "", ""
 
+    def _pick_bg_typo(self, obj: dict):
+        bg = obj.get("bg") or obj.get("background") or obj.get("background_prompt") or ""
+        ty = obj.get("typo") or obj.get("typography") or obj.get("typography_prompt") or obj.get("text_layout") or ""
+        return bg, ty
+
     def _robust_parse(self, text: str, format_mode: str):
         if format_mode == "auto_json_first":
             obj = self._extract_json_obj(text)
             if isinstance(obj, dict):
-                bg = obj.get("bg") or obj.get("background") or obj.get("background_prompt") or ""
-                ty = obj.get("typo") or obj.get("typography") or obj.get("typography_prompt") or obj.get("text_layout") or ""
+                bg, ty = self._pick_bg_typo(obj)
                 if bg or ty:
                     return (bg or "").strip(), (ty or "").strip()
 
@@ -326,37 +465,227 @@ class DeepseekDualPromptComposer:
             ty = f"ParseError: missing 文字排版提示语 | RAW: {text[:500]}"
         return bg, ty
 
+    # ---------- 解析：多条打包 ----------
+    def _extract_json_items(self, text: str):
+        """从回复中取出结果数组：支持 {"items": [...]}、裸数组、代码块包裹。"""
+        if not text:
+            return []
+        candidates = []
+        m = re.search(r"```(?:json)?\s*([\s\S]+?)```", text, re.IGNORECASE)
+        if m:
+            candidates.append(m.group(1).strip())
+        candidates.append(text.strip())
+        m = re.search(r"[\[{][\s\S]*[\]}]", text)
+        if m:
+            candidates.append(m.group(0))
+        for s in candidates:
+            try:
+                obj = json.loads(s)
+            except Exception:
+                continue
+            if isinstance(obj, list):
+                return obj
+            if isinstance(obj, dict):
+                for k in ("items", "results", "data", "prompts"):
+                    if isinstance(obj.get(k), list):
+                        return obj[k]
+                lists = [v for v in obj.values() if isinstance(v, list)]
+                if lists:
+                    return lists[0]
+                if "id" in obj:
+                    return [obj]
+        return []
+
+    def _robust_parse_batch(self, text: str, ids):
+        """
+        按 id 拆分并校验打包结果，返回 {id: (bg, typo)}；
+        缺失、重复或 bg/typo 为空的条目不返回，由调用方重新请求。
+        """
+        wanted = set(ids)
+        out = {}
+        for entry in self._extract_json_items(text):
+            if not isinstance(entry, dict):
+                continue
+            pid = str(entry.get("id", "")).strip()
+            if pid not in wanted or pid in out:
+                continue
+            bg, ty = self._pick_bg_typo(entry)
+            if isinstance(bg, str) and isinstance(ty, str) and bg.strip() and ty.strip():
+                out[pid] = (bg.strip(), ty.strip())
+        return out
+
+    # ---------- Key 池 / 脱敏 ----------
+    def _resolve_key_pool(self, api_key_file: str, api_key_env: str):
+        try:
+            return get_pool(api_key_file, api_key_env)
+        except OSError as e:
+            print(f"[DeepseekDualPromptComposer] 读取 Key 池失败，改用单个 api_key: {e}")
+            return None
+
+    def _redact(self, text: str, api_key: str, key_pool) -> str:
+        # 供应商的报错有时会回显 key，输出前统一抹掉
+        if key_pool is not None:
+            text = key_pool.redact(text)
+        if api_key and len(api_key) >= 8 and api_key in text:
+            text = text.replace(api_key, "<api_key>")
+        return text
+
+    # ---------- 超时降级 ----------
+    def _remember_good(self, topic: str, title_text: str, bg: str, typo: str):
+        if bg.startswith("ParseError:") or typo.startswith("ParseError:"):
+            return
+        with self._LAST_GOOD_LOCK:
+            self._LAST_GOOD[(topic, title_text)] = (bg, typo)
+            self._LAST_GOOD.move_to_end((topic, title_text))
+            while len(self._LAST_GOOD) > self.LAST_GOOD_MAX:
+                self._LAST_GOOD.popitem(last=False)
+
+    def _degrade(self, topic: str, title_text: str, reason: str, on_timeout: str):
+        if on_timeout == "last_good":
+            with self._LAST_GOOD_LOCK:
+                cached = self._LAST_GOOD.get((topic, title_text))
+            if cached:
+                print(f"[DeepseekDualPromptComposer] {reason}，沿用上次成功的输出")
+                return cached
+        err = f"Error: {reason}"
+        return (err, err)
+
     # ---------- 主函数 ----------
+    @profile_node("DeepseekDualPromptComposer.compose")
     def compose(self,
                 instruction, prompt_topic, title_text, timestamp_seed,
                 api_key, api_choice, model,
                 temperature, max_tokens, top_p,
                 top_k=50, frequency_penalty=0.0,
                 use_system_role=True, format_mode="auto_json_first",
-                strict_json=True, language="en", auto_random_seed=True):
+                strict_json=True, language="en", auto_random_seed=True,
+                timeout_budget=60.0, max_retries=2, on_timeout="last_good",
+                api_key_file="", api_key_env=""):
 
         # 简单直接：如果开启自动随机，就生成新种子；否则使用输入的种子
         if auto_random_seed:
-            actual_seed = int(time.time() * 1000000) % 2147483647 + random.randint(0, 99999)
+            actual_seed = int(time.time() * 1000000) % 2147483647 + random.Random().randint(0, 99999)
             print(f"[DeepseekDualPromptComposer] 使用自动生成的随机种子: {actual_seed}")
         else:
             actual_seed = timestamp_seed
             print(f"[DeepseekDualPromptComposer] 使用手动设置的种子: {actual_seed}")
-        
-        messages = self._build_messages(instruction, prompt_topic, title_text,
-                                        use_system_role, format_mode, language, actual_seed)
+
+        req = ComposeRequest(instruction, prompt_topic, title_text, actual_seed,
+                             session_id_for(actual_seed, auto_random_seed),
+                             use_system_role, format_mode, language)
+        api = ApiRequest(api_choice, api_key, model, temperature, max_tokens, top_p, top_k,
+                         frequency_penalty, strict_json, actual_seed)
+        with span("build_messages"):
+            messages = self._build_messages(req)
+        key_pool = self._resolve_key_pool(api_key_file, api_key_env)
+        deadline = Deadline(timeout_budget)
         try:
-            content, err = self._call_api(api_choice, api_key, model, messages,
-                                          temperature, max_tokens, top_p, top_k,
-                                          frequency_penalty, strict_json, actual_seed)
+            content, err = self._call_api(api, messages, deadline=deadline, max_retries=max_retries,
+                                          key_pool=key_pool)
             if err:
+                err = self._redact(err, api_key, key_pool)
                 return (f"Error: {err}", f"Error: {err}")
-            bg, typo = self._robust_parse(content or "", format_mode)
+            with span("parse"):
+                bg, typo = self._robust_parse(content or "", format_mode)
+            self._remember_good(prompt_topic, title_text, bg, typo)
             return (bg, typo)
+        except DeadlineExceeded as e:
+            return self._degrade(prompt_topic, title_text, str(e), on_timeout)
+        except Cancelled:
+            # 在 ComfyUI 中交回 InterruptProcessingException，队列按正常中断处理
+            raise_if_interrupted()
+            err = "Error: cancelled"
+            return (err, err)
         except Exception as e:
-            err = f"Error: {e}"
+            err = self._redact(f"Error: {e}", api_key, key_pool)
             return (err, err)
 
+    # ---------- 打包模式（batch_cli 使用） ----------
+    @profile_node("DeepseekDualPromptComposer.compose_many")
+    def compose_many(self,
+                     instruction, pairs, seeds,
+                     api_key, api_choice, model,
+                     temperature, max_tokens, top_p,
+                     top_k=50, frequency_penalty=0.0,
+                     use_system_role=True, strict_json=True, language="en",
+                     pack_size=8, max_rounds=3,
+                     timeout_budget=60.0, max_retries=2,
+                     api_key_file="", api_key_env=""):
+        """
+        多组 (主题, 标题) 打包进一次请求：System 指令只发一次，按 id 拆分回复，
+        缺失或格式错误的条目在下一轮重新打包请求，最多 max_rounds 轮。
+        max_tokens 为单条预算，打包时按条数放大（不超过 PACK_MAX_TOKENS）。
+        返回与 pairs 等长的 [(bg, typo), ...]，失败条目为 "Error: ..." 字符串。
+        """
+        n = len(pairs)
+        results = [None] * n
+        errors = ["missing from packed response"] * n
+        key_pool = self._resolve_key_pool(api_key_file, api_key_env)
+        pack_size = max(1, int(pack_size))
+        pending = list(range(n))
+
+        cancelled = False
+        max_rounds = max(1, int(max_rounds))
+        for round_no in range(max_rounds):
+            if not pending or cancelled:
+                break
+            still = []
+            for start in range(0, len(pending), pack_size):
+                idx = pending[start:start + pack_size]
+                entries = [(str(j + 1), pairs[i][0], pairs[i][1], int(seeds[i])) for j, i in enumerate(idx)]
+                pack_seed = int(seeds[idx[0]])
+                with span("build_messages", items=len(idx), round=round_no):
+                    messages = self._build_batch_messages(instruction, entries, use_system_role,
+                                                          language, pack_seed)
+                try:
+                    api = ApiRequest(api_choice, api_key, model, temperature,
+                                     min(self.PACK_MAX_TOKENS, int(max_tokens) * len(idx)), top_p, top_k,
+                                     frequency_penalty, strict_json, pack_seed)
+                    content, err = self._call_api(api, messages, deadline=Deadline(timeout_budget),
+                                                  max_retries=max_retries, key_pool=key_pool)
+                except Cancelled:
+                    raise_if_interrupted()
+                    err, content = "cancelled", None
+                except Exception as e:  # 含 DeadlineExceeded：本包条目留待下一轮
+                    err, content = str(e), None
+
+                if err:
+                    err = self._redact(err, api_key, key_pool)
+                    for i in idx:
+                        errors[i] = err
+                    still.extend(idx)
+                    if err == "cancelled":
+                        for i in pending[start:]:
+                            errors[i] = err
+                        cancelled = True
+                        break
+                    continue
+
+                with span("parse", items=len(idx)):
+                    parsed = self._robust_parse_batch(content or "", [e[0] for e in entries])
+                for (pid, _, _, _), i in zip(entries, idx):
+                    if pid in parsed:
+                        results[i] = parsed[pid]
+                        self._remember_good(pairs[i][0], pairs[i][1], *parsed[pid])
+                    else:
+                        errors[i] = "missing or malformed item in packed response"
+                        still.append(i)
+            pending = still
+            if pending and not cancelled:
+                if round_no + 1 < max_rounds:
+                    print(f"[DeepseekDualPromptComposer] 打包第 {round_no + 1} 轮缺失 {len(pending)} 条，重新请求")
+                else:
+                    print(f"[DeepseekDualPromptComposer] 打包第 {round_no + 1} 轮（最后一轮）仍缺失 {len(pending)} 条，记为错误")
+
+        out = []
+        for i in range(n):
+            if results[i] is None:
+                err = f"Error: {errors[i]}"
+                out.append((err, err))
+            else:
+                out.append(results[i])
+        return out
+
 
 NODE_CLASS_MAPPINGS = {
     "DeepseekDualPromptComposer": DeepseekDualPromptComposer,
@@ -7,6 +7,8 @@
 
 from typing import List
 
+from .profiling import profile_node, span
+
 class PromptListStandalone:
     """
     提示词列表1.1
@@ -65,8 +67,10 @@ class PromptListStandalone:
         conditionings = []
         for p in prompts:
             try:
-                tokens = clip.tokenize(p)
-                cond, pooled = clip.encode_from_tokens(tokens, return_pooled=True)
+                with span("clip_tokenize"):
+                    tokens = clip.tokenize(p)
+                with span("clip_encode"):
+                    cond, pooled = clip.encode_from_tokens(tokens, return_pooled=True)
                 conditionings.append([cond, {"pooled_output": pooled}])
             except Exception as e:
                 print(f"[PromptListStandalone] CLIP编码错误 '{p[:30]}...': {e}")
@@ -74,6 +78,7 @@ class PromptListStandalone:
                 continue
         return conditionings
 
+    @profile_node("PromptListStandalone.process_list")
     def process_list(self,
                      prompt_count: int,
                      prompt_1: str = "", prompt_2: str = "", prompt_3: str = "",
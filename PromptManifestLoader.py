@@ -0,0 +1,119 @@
+# PromptManifestLoader.py
+# CATEGORY = "VisioStar"
+# 读取 batch_cli 预生成的 JSONL 清单：按序号或 id 取出一条记录，
+# 输出双提示语与尺寸列表，渲染队列里不再实时调用 API。
+
+import json
+import os
+
+from .profiling import profile_node
+
+
+class PromptManifestLoader:
+    """
+    提示语清单读取（batch_cli 输出）
+    - manifest_path：batch_cli -o 写出的 JSONL
+    - index：第几条（从 0 开始，超出范围时取模循环）
+    - item_id：非空时按 id 精确查找，忽略 index
+    同一 id 出现多次（断点续跑重试）时以最后一条为准。
+    输出：
+      0) bg_prompt / 1) typo_prompt（STRING）
+      2) sizes_list（LIST）：latent_sizes 的 (W,H) 列表，缺省时退回 seedream_sizes
+      3) total_count（INT）：清单中的记录数
+      4) sizes_text（STRING）：同一组尺寸写成「自定义尺寸」格式（每行 WxH），
+         可直接接到 SizeListLatentGenerator / Seedream 尺寸节点的「自定义尺寸」输入（记得取消勾选预设）
+    """
+
+    _CACHE = {}  # path -> (mtime, records)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "manifest_path": ("STRING", {"multiline": False, "default": ""}),
+                "index": ("INT", {"default": 0, "min": 0, "max": 0xFFFFFFFF, "step": 1}),
+            },
+            "optional": {
+                "item_id": ("STRING", {"multiline": False, "default": ""}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "LIST", "INT", "STRING")
+    RETURN_NAMES = ("bg_prompt", "typo_prompt", "sizes_list", "total_count", "sizes_text")
+    FUNCTION = "load"
+    CATEGORY = "VisioStar"
+
+    @classmethod
+    def IS_CHANGED(cls, manifest_path, index=0, item_id=""):
+        try:
+            mtime = os.path.getmtime(manifest_path)
+        except OSError:
+            mtime = 0
+        return f"{manifest_path}|{mtime}|{index}|{item_id}"
+
+    # ---------- helpers ----------
+    def _read_records(self, path: str):
+        mtime = os.path.getmtime(path)
+        cached = self._CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        by_id = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(rec, dict) and "id" in rec:
+                    by_id[str(rec["id"])] = rec  # 后写入的覆盖先写入的，字典保持首次出现的顺序
+        records = list(by_id.values())
+        self._CACHE[path] = (mtime, records)
+        return records
+
+    def _sizes(self, rec: dict):
+        if rec.get("latent_sizes"):
+            return [(int(w), int(h)) for w, h in rec["latent_sizes"]]
+        return [(int(s["width"]), int(s["height"])) for s in rec.get("seedream_sizes") or []]
+
+    @staticmethod
+    def _sizes_text(sizes) -> str:
+        return "\n".join(f"{w}x{h}" for w, h in sizes)
+
+    @profile_node("PromptManifestLoader.load")
+    def load(self, manifest_path, index=0, item_id=""):
+        path = (manifest_path or "").strip()
+        if not path or not os.path.exists(path):
+            err = f"Error: manifest not found: {path}"
+            return (err, err, [], 0, "")
+
+        records = self._read_records(path)
+        if not records:
+            err = f"Error: manifest is empty: {path}"
+            return (err, err, [], 0, "")
+
+        item_id = (item_id or "").strip()
+        if item_id:
+            rec = next((r for r in records if str(r["id"]) == item_id), None)
+            if rec is None:
+                err = f"Error: id not found in manifest: {item_id}"
+                return (err, err, [], len(records), "")
+        else:
+            rec = records[int(index) % len(records)]
+
+        sizes = self._sizes(rec)
+        if rec.get("error"):
+            err = f"Error: {rec['error']}"
+            return (err, err, sizes, len(records), self._sizes_text(sizes))
+        return (rec.get("bg_prompt", ""), rec.get("typo_prompt", ""), sizes, len(records), self._sizes_text(sizes))
+
+
+NODE_CLASS_MAPPINGS = {
+    "PromptManifestLoader": PromptManifestLoader,
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "PromptManifestLoader": "提示语清单读取（batch_cli 输出）",
+}
@@ -3,9 +3,12 @@
 # 单节点：把选中的多组尺寸生成为一个 LATENT 列表输出。
 # 连接到采样器的 latent/latent_image 接口后，ComfyUI 会按列表顺序逐个出图。
 
-import torch
 import re
 
+from .latent_budget import describe_split, resolve_budget, split_batch
+from .latent_noise import NOISE_MODES, SEED_MAX, SeededNoise, item_seeds, make_latent
+from .profiling import profile_node, span
+
 class SizeListLatentGenerator:
     """
     尺寸列表 → LATENT（顺序执行）
@@ -19,10 +22,18 @@ class SizeListLatentGenerator:
     说明：
     - 可勾选任意多个预设；也可在“自定义尺寸”里追加多对宽高（逗号/空格/换行分隔，支持 1024x1536 / 1024*1536 / 1024,1536）。
     - latent 尺寸需能被 8 整除；提供“对齐到8的倍数（向下）”开关（默认开启）。
+    - 采样内存预算_MB（可选，0=不限制，-1=自动：空闲显存扣除推理保留，未加载的模型不计入）：按 latent_budget 的内存模型估算每张图的采样峰值，
+      放不下的批量会被均分成多个列表项（如 64 张 → 22/21/21），每项都在预算之内。
+    - 噪声模式（可选）：zeros=空 latent（默认）；gaussian=带种子的高斯噪声，第 k 张图（按列表顺序连续编号）
+      的种子为 噪声种子+k，与批量/拆分方式无关，可逐张复现。
     - 输出：
-        0) latent（LIST）：每个尺寸对应一个空 latent（zeros），shape=[batch,4,H/8,W/8]
-        1) sizes_list（LIST）：对齐后的 (W,H) 列表（便于命名/调试）
-        2) total_count（INT）：尺寸数量
+        0) latent（LIST）：每个尺寸（拆分后为每一份）对应一个 latent，shape=[batch,4,H/8,W/8]
+        1) sizes_list（LIST）：与 latent 一一对应的对齐后 (W,H) 列表（便于命名/调试）
+        2) total_count（INT）：latent 列表项数量
+        3) split_plan（STRING）：每个尺寸的估算内存与拆分结果
+        4) seed_list（LIST）：gaussian 模式下按顺序排列的每张图种子（zeros 模式为空列表）
+        5) noise（NOISE 列表，与 latent 一一对应）：按同样的 噪声种子+k 生成噪声，接 SamplerCustomAdvanced 的 noise；
+           与 zeros 模式的 latent 搭配即可逐张复现，EPS / v-pred / flow 模型通用
     - 把第一个输出直接接到采样器的 latent/latent_image，点击 Queue Prompt 即可顺序出不同尺寸的图。
     """
 
@@ -57,12 +68,19 @@ class SizeListLatentGenerator:
 
                 # 对齐到8的倍数（latent/UNet 要求）
                 "对齐到8的倍数_向下取整": ("BOOLEAN", {"default": True}),
+            },
+            "optional": {
+                # 超出预算的批量自动拆成多个列表项
+                "采样内存预算_MB": ("INT", {"default": 0, "min": -1, "max": 1 << 20, "step": 256}),
+                # 带种子的高斯噪声 latent
+                "噪声模式": (NOISE_MODES, {"default": "zeros"}),
+                "噪声种子": ("INT", {"default": 0, "min": 0, "max": SEED_MAX, "control_after_generate": True}),
             }
         }
 
-    RETURN_TYPES = ("LATENT", "LIST", "INT")
-    RETURN_NAMES = ("latent", "sizes_list", "total_count")
-    OUTPUT_IS_LIST = (True, False, False)  # ✅ 第一口是列表 → 会被拆分为多次顺序执行
+    RETURN_TYPES = ("LATENT", "LIST", "INT", "STRING", "LIST", "NOISE")
+    RETURN_NAMES = ("latent", "sizes_list", "total_count", "split_plan", "seed_list", "noise")
+    OUTPUT_IS_LIST = (True, False, False, False, False, True)  # ✅ 第一口是列表 → 会被拆分为多次顺序执行
     FUNCTION = "build"
     CATEGORY = "VisioStar"
 
@@ -92,16 +110,18 @@ class SizeListLatentGenerator:
                     out.append((w, h))
         return out
 
-    def build(self,
-              选_1_1_1328x1328=True,
-              选_3_4_1140x1472=False,
-              选_4_3_1472x1140=False,
-              选_9_16_928x1664=False,
-              选_16_9_1664x928=False,
-              自定义尺寸="",
-              每尺寸批量张数=1,
-              对齐到8的倍数_向下取整=True):
-
+    def plan_sizes(self,
+                   选_1_1_1328x1328=True,
+                   选_3_4_1140x1472=False,
+                   选_4_3_1472x1140=False,
+                   选_9_16_928x1664=False,
+                   选_16_9_1664x928=False,
+                   自定义尺寸="",
+                   对齐到8的倍数_向下取整=True):
+        """
+        只做尺寸规划（不分配 latent）：预设 + 自定义 → 去重 → 可选对齐，返回 [(W,H), ...]。
+        build 与无头批处理（batch_cli）共用这段逻辑。
+        """
         # 1) 汇总尺寸（预设 + 自定义）
         selected = []
         if 选_1_1_1328x1328: selected.append(self.PRESETS["1:1 - 1328 x 1328"])
@@ -110,7 +130,8 @@ class SizeListLatentGenerator:
         if 选_9_16_928x1664: selected.append(self.PRESETS["9:16 - 928 x 1664"])
         if 选_16_9_1664x928: selected.append(self.PRESETS["16:9 - 1664 x 928"])
 
-        selected.extend(self._parse_custom_sizes(自定义尺寸))
+        with span("parse_sizes"):
+            selected.extend(self._parse_custom_sizes(自定义尺寸))
 
         # 去重且保持顺序
         seen = set()
@@ -131,20 +152,55 @@ class SizeListLatentGenerator:
             if 对齐到8的倍数_向下取整:
                 w, h = self._snap8(w, h)
             aligned.append((w, h))
+        return aligned
 
-        # 3) 生成 LATENT 列表
-        latents = []
+    @profile_node("SizeListLatentGenerator.build")
+    def build(self,
+              选_1_1_1328x1328=True,
+              选_3_4_1140x1472=False,
+              选_4_3_1472x1140=False,
+              选_9_16_928x1664=False,
+              选_16_9_1664x928=False,
+              自定义尺寸="",
+              每尺寸批量张数=1,
+              对齐到8的倍数_向下取整=True,
+              采样内存预算_MB=0,
+              噪声模式="zeros",
+              噪声种子=0):
+
+        aligned = self.plan_sizes(选_1_1_1328x1328, 选_3_4_1140x1472, 选_4_3_1472x1140,
+                                  选_9_16_928x1664, 选_16_9_1664x928,
+                                  自定义尺寸, 对齐到8的倍数_向下取整)
+
+        # 3) 按内存预算拆分批量
+        budget = resolve_budget(采样内存预算_MB)
+        plan, report = [], []
         for (w, h) in aligned:
-            c = 4
-            H8 = max(1, h // 8)
-            W8 = max(1, w // 8)
-            samples = torch.zeros((每尺寸批量张数, c, H8, W8), dtype=torch.float32, device="cpu")
-            latents.append({"samples": samples})
+            chunks = split_batch(w, h, 每尺寸批量张数, budget)
+            plan.extend(((w, h), n) for n in chunks)
+            report.append(describe_split(w, h, chunks, budget))
 
-        sizes_list = [(int(w), int(h)) for (w, h) in aligned]
+        # 4) 生成 LATENT 列表
+        latents = []
+        seed_list = []
+        noises = []
+        start = 0
+        with span("alloc_latents", count=len(plan), batch=每尺寸批量张数, noise=噪声模式):
+            for (w, h), n in plan:
+                c = 4
+                H8 = max(1, h // 8)
+                W8 = max(1, w // 8)
+                seeds = item_seeds(噪声种子, start, n) if 噪声模式 == "gaussian" else []
+                samples = make_latent(n, c, H8, W8, 噪声模式, seeds)
+                seed_list.extend(seeds)
+                latents.append({"samples": samples})
+                noises.append(SeededNoise(item_seeds(噪声种子, start, 1)[0]))
+                start += n
+
+        sizes_list = [(int(w), int(h)) for (w, h), _ in plan]
         total = len(latents)
 
-        return (latents, sizes_list, total)
+        return (latents, sizes_list, total, "\n".join(report), seed_list, noises)
 
 
 NODE_CLASS_MAPPINGS = {
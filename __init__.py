@@ -6,6 +6,7 @@ from .DeepseekDualPromptComposer import NODE_CLASS_MAPPINGS as DSD_MAPPINGS, NOD
 from .PromptListStandalone import NODE_CLASS_MAPPINGS as PLS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PLS_NAMES
 from .SizeListLatentGenerator import NODE_CLASS_MAPPINGS as SLLG_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as SLLG_NAMES
 from .ByteDanceSeedreamSizeList import NODE_CLASS_MAPPINGS as BDSL_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as BDSL_NAMES
+from .PromptManifestLoader import NODE_CLASS_MAPPINGS as PML_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PML_NAMES
 
 # 合并所有节点的映射
 NODE_CLASS_MAPPINGS = {}
@@ -14,6 +15,7 @@ NODE_CLASS_MAPPINGS.update(DSD_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(PLS_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(SLLG_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(BDSL_MAPPINGS)
+NODE_CLASS_MAPPINGS.update(PML_MAPPINGS)
 
 NODE_DISPLAY_NAME_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS.update(ALS_NAMES)
@@ -21,3 +23,4 @@ NODE_DISPLAY_NAME_MAPPINGS.update(DSD_NAMES)
 NODE_DISPLAY_NAME_MAPPINGS.update(PLS_NAMES)
 NODE_DISPLAY_NAME_MAPPINGS.update(SLLG_NAMES)
 NODE_DISPLAY_NAME_MAPPINGS.update(BDSL_NAMES)
+NODE_DISPLAY_NAME_MAPPINGS.update(PML_NAMES)
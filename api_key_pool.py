@@ -0,0 +1,223 @@
+# api_key_pool.py
+# 多 API Key 池：把请求路由到「剩余额度最多 / 在途请求最少」的 key，
+# 记录每个 key 的 429、错误与延迟，并临时剔除表现异常的 key。
+#
+# key 来源（二选一或同时使用，自动去重）：
+#   - 文件：每行一个 key，# 开头为注释，也支持逗号分隔
+#   - 环境变量：逗号 / 换行 / 空白分隔
+# key 本身只存在于内存与 Authorization 头中；日志、统计与报错里只出现 "key#N" 标签。
+
+import math
+import os
+import re
+import threading
+import time
+
+REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+
+
+class KeyState:
+    __slots__ = ("key", "label", "in_flight", "remaining", "requests", "n_429", "n_errors",
+                 "strikes", "consecutive_errors", "ewma_latency", "ejected_until")
+
+    def __init__(self, key: str, label: str):
+        self.key = key
+        self.label = label
+        self.in_flight = 0
+        self.remaining = None  # 服务端通过响应头告知的剩余额度（未知为 None）
+        self.requests = 0
+        self.n_429 = 0
+        self.n_errors = 0
+        self.strikes = 0
+        self.consecutive_errors = 0
+        self.ewma_latency = 0.0
+        self.ejected_until = 0.0
+
+    def __repr__(self):  # 防止被意外打印时泄露 key
+        return f"<KeyState {self.label}>"
+
+
+class ApiKeyPool:
+    UNKNOWN_REMAINING = 1_000_000  # 未知额度视为充足，此时退化为「在途最少」
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, keys, eject_after_errors: int = 3, eject_s: float = 30.0, max_eject_s: float = 300.0):
+        uniq = list(dict.fromkeys(k.strip() for k in keys if k and k.strip()))
+        if not uniq:
+            raise ValueError("ApiKeyPool 需要至少一个 key")
+        self._keys = [KeyState(k, f"key#{i + 1}") for i, k in enumerate(uniq)]
+        self._lock = threading.Lock()
+        self.eject_after_errors = int(eject_after_errors)
+        self.eject_s = float(eject_s)
+        self.max_eject_s = float(max_eject_s)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"<ApiKeyPool {len(self._keys)} keys>"
+
+    # ---------- 路由 ----------
+    def acquire(self) -> KeyState:
+        """挑选 key 并计入在途；全部被剔除时选最早恢复的那个，而不是直接失败。"""
+        now = time.monotonic()
+        with self._lock:
+            live = [k for k in self._keys if k.ejected_until <= now]
+            if live:
+                def score(k):
+                    rem = k.remaining if k.remaining is not None else self.UNKNOWN_REMAINING
+                    # 延迟按 10ms 分档比较（浮点 EWMA 几乎不会完全相等），同档再按累计请求数轮转
+                    return (-(rem - k.in_flight), k.in_flight, round(k.ewma_latency * 100), k.requests)
+                ks = min(live, key=score)
+            else:
+                ks = min(self._keys, key=lambda k: k.ejected_until)
+            ks.in_flight += 1
+            ks.requests += 1
+            return ks
+
+    def ready_in(self, ks: KeyState) -> float:
+        """该 key 还需冷却多少秒（acquire 在全部被剔除时会返回仍在冷却中的 key）。"""
+        with self._lock:
+            return max(0.0, ks.ejected_until - time.monotonic())
+
+    def release(self, ks: KeyState, status, latency: float = 0.0, headers=None):
+        """
+        status：HTTP 状态码；None 表示网络错误；"cancelled" 表示本地主动取消（不计入惩罚）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            ks.in_flight = max(0, ks.in_flight - 1)
+            if status == "cancelled":
+                return
+            if latency > 0:
+                ks.ewma_latency = latency if ks.ewma_latency == 0 else (
+                    self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * ks.ewma_latency)
+            has_remaining = self._update_remaining(ks, headers)
+
+            if status == 429:
+                ks.n_429 += 1
+                ks.strikes += 1
+                retry_after = _header_float(headers, "retry-after")
+                backoff = retry_after if retry_after is not None else self.eject_s * (2 ** (ks.strikes - 1))
+                ks.ejected_until = now + min(self.max_eject_s, backoff)
+                # 冷却已经表示「暂时没额度」；记成 0 的话，在不回传额度头的服务（如 DeepSeek）上
+                # 这个 key 冷却结束后会一直排在其他 key 之后，再也选不到
+                ks.remaining = None
+            elif status in (401, 403):
+                # key 无效或被封禁：长时间剔除
+                ks.n_errors += 1
+                ks.ejected_until = now + self.max_eject_s
+            elif status is None or (isinstance(status, int) and status >= 500):
+                ks.n_errors += 1
+                ks.consecutive_errors += 1
+                if ks.consecutive_errors >= self.eject_after_errors:
+                    ks.ejected_until = now + self.eject_s
+                    ks.consecutive_errors = 0
+            else:
+                ks.consecutive_errors = 0
+                ks.strikes = 0
+                if not has_remaining:
+                    ks.remaining = None  # 没有额度头时不保留旧值
+
+    def _update_remaining(self, ks: KeyState, headers) -> bool:
+        for name in REMAINING_HEADERS:
+            v = _header_float(headers, name)
+            if v is not None:
+                ks.remaining = int(v)
+                return True
+        return False
+
+    # ---------- 观测 / 脱敏 ----------
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "label": k.label,
+                "requests": k.requests,
+                "in_flight": k.in_flight,
+                "remaining": k.remaining,
+                "n_429": k.n_429,
+                "n_errors": k.n_errors,
+                "ewma_latency_ms": round(k.ewma_latency * 1000, 1),
+                "ejected_for_s": round(max(0.0, k.ejected_until - now), 1),
+            } for k in self._keys]
+
+    def describe(self):
+        """stats() 的可读版本：每个 key 一行，只含标签（batch_cli 结束时打印）。"""
+        lines = []
+        for st in self.stats():
+            line = (f"{st['label']}: 请求 {st['requests']}，429 {st['n_429']} 次，错误 {st['n_errors']} 次，"
+                    f"延迟≈{st['ewma_latency_ms']:.0f}ms")
+            if st["remaining"] is not None:
+                line += f"，剩余额度 {st['remaining']:g}"
+            if st["ejected_for_s"] > 0:
+                line += f"，剔除中（还剩 {st['ejected_for_s']:.0f}s）"
+            lines.append(line)
+        return lines
+
+    def redact(self, text: str) -> str:
+        """把文本里出现的任何 key 替换成它的标签（供应商报错有时会回显 key）。"""
+        if not text:
+            return text
+        for k in self._keys:
+            if k.key in text:
+                text = text.replace(k.key, f"<{k.label}>")
+        return text
+
+
+def _header_float(headers, name: str):
+    if not headers:
+        return None
+    v = headers.get(name)
+    if v is None:
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return f if math.isfinite(f) else None
+
+
+# ---------- 加载与共享 ----------
+def parse_keys(text: str):
+    keys = []
+    for line in (text or "").splitlines():
+        line = line.split("#", 1)[0]
+        keys.extend(p for p in re.split(r"[,\s]+", line) if p)
+    return keys
+
+
+def load_keys(key_file: str = "", key_env: str = ""):
+    keys = []
+    if key_file:
+        with open(os.path.expanduser(key_file), "r", encoding="utf-8") as f:
+            keys.extend(parse_keys(f.read()))
+    if key_env:
+        keys.extend(parse_keys(os.environ.get(key_env, "")))
+    return list(dict.fromkeys(keys))
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(key_file: str = "", key_env: str = ""):
+    """
+    按来源复用同一个池（同一进程内多个节点实例共享统计与剔除状态）。
+    文件被修改或环境变量变化时重建；没有任何 key 时返回 None。
+    """
+    key_file = (key_file or "").strip()
+    key_env = (key_env or "").strip()
+    if not key_file and not key_env:
+        return None
+    mtime = os.path.getmtime(os.path.expanduser(key_file)) if key_file else None
+    env_val = os.environ.get(key_env, "") if key_env else ""
+    ident = (key_file, mtime, key_env, hash(env_val))
+    with _POOLS_LOCK:
+        cached = _POOLS.get((key_file, key_env))
+        if cached and cached[0] == ident:
+            return cached[1]
+        keys = load_keys(key_file, key_env)
+        pool = ApiKeyPool(keys) if keys else None
+        _POOLS[(key_file, key_env)] = (ident, pool)
+        return pool
@@ -0,0 +1,389 @@
+# batch_cli.py
+# 无头批处理：不启动 ComfyUI，离线预生成「双提示语 + 尺寸清单」，结果流式写入 JSONL，
+# 之后在 ComfyUI 里用「提示语清单读取」节点（PromptManifestLoader）直接读取，渲染队列里不再调 API。
+#
+# 运行（在 ComfyUI/custom_nodes 目录下）：
+#   python -m tooltip.batch_cli -i topics.jsonl -o manifest.jsonl --api-key-env DEEPSEEK_API_KEY --workers 8
+# 也可直接运行脚本：python tooltip/batch_cli.py ...
+#
+# 输入 JSONL 每行一个对象：
+#   {"id": "sku-001", "topic": "夏日海边氛围", "title": "SUMMER TIDES", "sizes": "1024x1536\n1216*1216", "seed": 42}
+#   - id 缺省时用 "line-<行号>"；seed 缺省时由 id 稳定推导（保证断点续跑结果可复现）
+#   - sizes 可以是字符串（与节点「自定义尺寸」写法相同）或 ["1024x1536", [1216, 1216], ...]
+# 输出 JSONL 每行一个对象：
+#   {"id", "seed", "bg_prompt", "typo_prompt", "latent_sizes": [[W,H],...],
+#    "seedream_sizes": [{"size_preset","width","height"},...], "error"?}
+#
+# 断点续跑：默认追加写入 -o，启动时跳过 -o 中已成功的 id（失败的会重跑）；--overwrite 从头开始。
+#
+# 打包：--pack-size K（K>1）把 K 组主题/标题放进同一次请求，System 指令只发送一次，
+# 回复按 id 拆分，缺失或格式错误的条目自动补发（--pack-rounds 轮）。自带 instruction 的条目仍单独请求。
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+if not __package__:
+    # 以脚本方式运行：把所在目录当作包 "tooltip" 加载，节点模块里的相对导入才能生效
+    import importlib.util
+
+    _root = os.path.dirname(os.path.abspath(__file__))
+    if "tooltip" not in sys.modules:
+        _spec = importlib.util.spec_from_file_location(
+            "tooltip", os.path.join(_root, "__init__.py"), submodule_search_locations=[_root]
+        )
+        _pkg = importlib.util.module_from_spec(_spec)
+        sys.modules["tooltip"] = _pkg
+        _spec.loader.exec_module(_pkg)
+    __package__ = "tooltip"
+
+from .ByteDanceSeedreamSizeList import ByteDanceSeedreamSizeList  # noqa: E402
+from .DeepseekDualPromptComposer import DeepseekDualPromptComposer  # noqa: E402
+from .SizeListLatentGenerator import SizeListLatentGenerator  # noqa: E402
+from .api_key_pool import get_pool  # noqa: E402
+
+# 工作进程内的共享状态（由 _init_worker 整体替换；线程模式下由 main 在启动线程池前构建一次）
+_WORKER = {}
+
+
+def _default_instruction() -> str:
+    return DeepseekDualPromptComposer.INPUT_TYPES()["required"]["instruction"][1]["default"]
+
+
+def _stable_seed(item_id: str) -> int:
+    return zlib.crc32(item_id.encode("utf-8")) % 2147483647
+
+
+def _sizes_text(sizes) -> str:
+    if not sizes:
+        return ""
+    if isinstance(sizes, str):
+        return sizes
+    parts = []
+    for s in sizes:
+        if isinstance(s, (list, tuple)) and len(s) >= 2:
+            parts.append(f"{int(s[0])}x{int(s[1])}")
+        else:
+            parts.append(str(s))
+    return "\n".join(parts)
+
+
+# ---------- 工作函数 ----------
+def _init_worker(config: dict):
+    global _WORKER
+    composer = DeepseekDualPromptComposer()
+    if config.get("base_url"):
+        base = config["base_url"].rstrip("/")
+        composer.API_URLS = {k: base + "/chat/completions" for k in composer.API_URLS}
+    # 先建好完整的新字典再一次性替换，读者永远看不到清空到一半的状态
+    _WORKER = {
+        "config": config,
+        "composer": composer,
+        "latent": SizeListLatentGenerator(),
+        "seedream": ByteDanceSeedreamSizeList(),
+    }
+
+
+def _plan_sizes(item: dict, config: dict) -> dict:
+    out = {}
+    text = _sizes_text(item.get("sizes"))
+    presets = config["with_default_presets"]
+    if config["sizes_for"] in ("latent", "both"):
+        aligned = _WORKER["latent"].plan_sizes(
+            选_1_1_1328x1328=presets, 自定义尺寸=text,
+            对齐到8的倍数_向下取整=config["align8"],
+        )
+        out["latent_sizes"] = [[int(w), int(h)] for w, h in aligned]
+    if config["sizes_for"] in ("seedream", "both"):
+        node = _WORKER["seedream"]
+        first_key = "选_" + re.sub(r"[^\d]+", "_", node.PRESETS[0][0]).strip("_")
+        merged = node.plan(**{first_key: presets, "自定义尺寸": text})
+        out["seedream_sizes"] = [{"size_preset": label, "width": int(w), "height": int(h)}
+                                 for label, w, h in merged]
+    return out
+
+
+def _process_item(item: dict) -> dict:
+    config = _WORKER["config"]
+    rec = {"id": item["id"], "seed": int(item["seed"])}
+    try:
+        rec.update(_plan_sizes(item, config))
+    except Exception as e:
+        rec["error"] = f"size planning failed: {e}"
+        return rec
+
+    if config["compose"]:
+        c = config["composer_args"]
+        bg, typo = _WORKER["composer"].compose(
+            item.get("instruction") or c["instruction"],
+            item.get("topic", ""), item.get("title", ""), rec["seed"],
+            c["api_key"], c["api_choice"], c["model"],
+            c["temperature"], c["max_tokens"], c["top_p"],
+            top_k=c["top_k"], frequency_penalty=c["frequency_penalty"],
+            use_system_role=c["use_system_role"], format_mode=c["format_mode"],
+            strict_json=c["strict_json"], language=c["language"],
+            auto_random_seed=False,
+            # 超时直接记为失败，下次续跑时重试，而不是写入沿用的旧结果
+            timeout_budget=c["timeout_budget"], max_retries=c["max_retries"], on_timeout="error",
+            api_key_file=c["api_key_file"], api_key_env=c["api_key_env"],
+        )
+        _set_prompts(rec, bg, typo)
+    return rec
+
+
+def _set_prompts(rec: dict, bg: str, typo: str):
+    rec["bg_prompt"] = bg
+    rec["typo_prompt"] = typo
+    if bg.startswith("Error:") or bg.startswith("ParseError:"):
+        rec["error"] = bg
+
+
+def _process_pack(items: list) -> list:
+    """一组条目共用一次（或几次补发）请求；返回与 items 等序的记录列表。"""
+    config = _WORKER["config"]
+    c = config["composer_args"]
+    recs, packable = [], []
+    for item in items:
+        if item.get("instruction"):
+            recs.append(_process_item(item))  # 自定义指令无法与其他条目共用 System 消息
+            continue
+        rec = {"id": item["id"], "seed": int(item["seed"])}
+        try:
+            rec.update(_plan_sizes(item, config))
+        except Exception as e:
+            rec["error"] = f"size planning failed: {e}"
+        else:
+            if config["compose"]:
+                packable.append((item, rec))
+        recs.append(rec)
+
+    if packable:
+        results = _WORKER["composer"].compose_many(
+            c["instruction"],
+            [(item.get("topic", ""), item.get("title", "")) for item, _ in packable],
+            [rec["seed"] for _, rec in packable],
+            c["api_key"], c["api_choice"], c["model"],
+            c["temperature"], c["max_tokens"], c["top_p"],
+            top_k=c["top_k"], frequency_penalty=c["frequency_penalty"],
+            use_system_role=c["use_system_role"], strict_json=c["strict_json"], language=c["language"],
+            pack_size=config["pack_size"], max_rounds=config["pack_rounds"],
+            timeout_budget=c["timeout_budget"], max_retries=c["max_retries"],
+            api_key_file=c["api_key_file"], api_key_env=c["api_key_env"],
+        )
+        for (_, rec), (bg, typo) in zip(packable, results):
+            _set_prompts(rec, bg, typo)
+    return recs
+
+
+# ---------- 输入 / 断点 ----------
+def _read_items(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[batch_cli] 跳过第 {n} 行（JSON 无效）: {e}", file=sys.stderr)
+                continue
+            if isinstance(item, str):
+                item = {"topic": item}
+            item_id = str(item.get("id") or f"line-{n}")
+            item["id"] = item_id
+            if item.get("seed") is None:
+                item["seed"] = _stable_seed(item_id)
+            yield item
+
+
+def _completed_ids(path: str) -> set:
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 上次中断时写了一半的行
+            if isinstance(rec, dict) and "id" in rec and not rec.get("error"):
+                done.add(str(rec["id"]))
+    return done
+
+
+# 未指定 --api-key / --api-key-env 时按 --api-choice 取对应服务商的环境变量，不把一家的 key 发给另一家
+DEFAULT_KEY_ENV = {"deepseek": "DEEPSEEK_API_KEY", "siliconflow": "SILICONFLOW_API_KEY"}
+
+
+def _api_key(args) -> str:
+    if args.api_key:
+        return args.api_key
+    for name in (args.api_key_env, DEFAULT_KEY_ENV.get(args.api_choice)):
+        if name and os.environ.get(name):
+            return os.environ[name]
+    return ""
+
+
+def _print_pool_stats(args):
+    """打印 key 池的逐 key 统计（线程模式下所有 worker 共用同一个池）。"""
+    if args.no_compose or not (args.api_key_file or args.api_key_pool_env):
+        return
+    if args.executor == "process":
+        print("[batch_cli] process 模式下每个 worker 进程各有一个 key 池，不汇总统计", file=sys.stderr)
+        return
+    try:
+        pool = get_pool(args.api_key_file, args.api_key_pool_env)
+    except OSError:
+        return
+    for line in (pool.describe() if pool is not None else []):
+        print(f"[batch_cli] {line}", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(
+        prog="tooltip.batch_cli",
+        description="离线批量生成双提示语与尺寸清单（JSONL → JSONL），无需 ComfyUI。",
+    )
+    ap.add_argument("-i", "--input", required=True, help="输入 JSONL")
+    ap.add_argument("-o", "--output", required=True, help="输出 JSONL（同时作为断点）")
+    ap.add_argument("--overwrite", action="store_true", help="忽略已有输出，从头开始")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--executor", choices=["process", "thread"], default="thread",
+                    help="并发方式（默认 thread：composer 可重入，线程间共享 key 池的限流/剔除状态）")
+    ap.add_argument("--no-compose", action="store_true", help="只做尺寸规划，不调用 API")
+    ap.add_argument("--sizes-for", choices=["latent", "seedream", "both", "none"], default="both")
+    ap.add_argument("--with-default-presets", action="store_true",
+                    help="在自定义尺寸之外附带节点的默认预设（1:1 1328 / Seedream 2048）")
+    ap.add_argument("--no-align8", action="store_true", help="latent 尺寸不对齐到 8 的倍数")
+    ap.add_argument("--pack-size", type=int, default=1,
+                    help="每次请求打包的条目数（1=逐条请求；>1 时固定使用 JSON 格式，忽略 --format-mode）")
+    ap.add_argument("--pack-rounds", type=int, default=3, help="打包模式下缺失条目的最多请求轮数")
+
+    g = ap.add_argument_group("composer")
+    g.add_argument("--api-key", default="", help="不建议：会出现在 shell 历史里，优先用 --api-key-env")
+    g.add_argument("--api-key-env", default="",
+                   help="从该环境变量读取 API Key（默认按 --api-choice 取 DEEPSEEK_API_KEY / SILICONFLOW_API_KEY）")
+    g.add_argument("--api-key-file", default="", help="Key 池文件（每行一个 key），与 --api-key-pool-env 可同时使用")
+    g.add_argument("--api-key-pool-env", default="", help="Key 池环境变量名（逗号/换行分隔的多个 key）")
+    g.add_argument("--api-choice", choices=["deepseek", "siliconflow"], default="deepseek")
+    g.add_argument("--base-url", default="", help="覆盖 API 地址（如本地代理 / stub），拼接 /chat/completions")
+    g.add_argument("--model", default="deepseek-chat")
+    g.add_argument("--instruction-file", default="", help="System 指令文件（默认用节点内置指令）")
+    g.add_argument("--temperature", type=float, default=0.7)
+    g.add_argument("--max-tokens", type=int, default=512)
+    g.add_argument("--top-p", type=float, default=0.7)
+    g.add_argument("--top-k", type=int, default=50)
+    g.add_argument("--frequency-penalty", type=float, default=0.0)
+    g.add_argument("--no-system-role", action="store_true")
+    g.add_argument("--format-mode", choices=["auto_json_first", "labels_only"], default="auto_json_first")
+    g.add_argument("--no-strict-json", action="store_true")
+    g.add_argument("--language", choices=["en", "zh"], default="en")
+    g.add_argument("--timeout-budget", type=float, default=60.0, help="单条总时限（秒，含重试）")
+    g.add_argument("--max-retries", type=int, default=2)
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    instruction = _default_instruction()
+    if args.instruction_file:
+        with open(args.instruction_file, "r", encoding="utf-8") as f:
+            instruction = f.read()
+
+    config = {
+        "compose": not args.no_compose,
+        "sizes_for": args.sizes_for,
+        "with_default_presets": args.with_default_presets,
+        "align8": not args.no_align8,
+        "base_url": args.base_url,
+        "pack_size": max(1, args.pack_size),
+        "pack_rounds": max(1, args.pack_rounds),
+        "composer_args": {
+            "instruction": instruction,
+            "api_key": _api_key(args),
+            "api_choice": args.api_choice,
+            "model": args.model,
+            "temperature": args.temperature,
+            "max_tokens": args.max_tokens,
+            "top_p": args.top_p,
+            "top_k": args.top_k,
+            "frequency_penalty": args.frequency_penalty,
+            "use_system_role": not args.no_system_role,
+            "format_mode": args.format_mode,
+            "strict_json": not args.no_strict_json,
+            "language": args.language,
+            "timeout_budget": args.timeout_budget,
+            "max_retries": args.max_retries,
+            "api_key_file": args.api_key_file,
+            "api_key_env": args.api_key_pool_env,
+        },
+    }
+    has_key = (config["composer_args"]["api_key"] or args.api_key_file or args.api_key_pool_env)
+    if config["compose"] and not has_key and not args.base_url:
+        print("[batch_cli] 未提供 API Key（--api-key-env / DEEPSEEK_API_KEY）", file=sys.stderr)
+        return 2
+
+    done = set() if args.overwrite else _completed_ids(args.output)
+    if done:
+        print(f"[batch_cli] 断点续跑：跳过 {len(done)} 条已完成记录", file=sys.stderr)
+
+    workers = max(1, args.workers)
+    if args.executor == "process":
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,))
+    else:
+        # 线程池按需懒启动线程：不能用 initializer，否则新线程会在老线程处理中途重建共享状态
+        _init_worker(config)
+        executor = ThreadPoolExecutor(max_workers=workers)
+    window = workers * 4  # 限制在途任务数，大文件也不会一次性全部提交
+    n_ok = n_err = 0
+    t0 = time.time()
+
+    with open(args.output, "w" if args.overwrite else "a", encoding="utf-8") as out, executor as ex:
+        pending = set()
+
+        def drain(block_until_below: int):
+            nonlocal n_ok, n_err
+            while len(pending) > block_until_below:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    pending.discard(fut)
+                    res = fut.result()
+                    for rec in (res if isinstance(res, list) else [res]):
+                        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                        if rec.get("error"):
+                            n_err += 1
+                        else:
+                            n_ok += 1
+                    out.flush()  # 逐条（逐包）落盘，中断后可续跑
+
+        pack = []
+        for item in _read_items(args.input):
+            if item["id"] in done:
+                continue
+            if config["pack_size"] == 1:
+                pending.add(ex.submit(_process_item, item))
+            else:
+                pack.append(item)
+                if len(pack) < config["pack_size"]:
+                    continue
+                pending.add(ex.submit(_process_pack, pack))
+                pack = []
+            drain(window)
+        if pack:
+            pending.add(ex.submit(_process_pack, pack))
+        drain(0)
+
+    dt = time.time() - t0
+    print(f"[batch_cli] 完成 {n_ok} 条，失败 {n_err} 条，用时 {dt:.1f}s -> {args.output}", file=sys.stderr)
+    _print_pool_stats(args)
+    return 0 if n_err == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
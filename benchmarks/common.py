@@ -0,0 +1,221 @@
+# benchmarks/common.py
+# 基准测试公共工具：
+# - load_pack()：不依赖 ComfyUI，直接把仓库根目录当作包 "tooltip" 导入（节点内的相对导入可用）
+# - measure()：计时（吞吐、延迟分位、MAD）+ 峰值内存（tracemalloc / RSS）
+# - 基线 JSON 的保存与对比（带绝对噪声下限，微秒级用例不会因抖动误报）
+
+import gc
+import importlib
+import importlib.util
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACK_NAME = "tooltip"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "baseline.json"
+
+SUB_MS_MIN_SAMPLES = 200   # 中位数 < 1ms 的用例至少采这么多次，保证中位数 / MAD 稳定
+SUB_MS_MAX_EXTRA_S = 0.5   # 追加采样的时间上限
+ABS_FLOOR_MS = 0.1         # 延迟差小于该值一律视为噪声
+MAD_K = 3.0                # 延迟差小于 k × MAD（基线与本次取大者）视为噪声
+P99_MIN_SAMPLES = 100      # 样本数不足时 p99 只是最大值附近的一两个点，不作为回归门槛
+
+
+def load_pack(name: str = PACK_NAME):
+    """以包的形式加载仓库根目录（等价于 ComfyUI 加载 custom_nodes/tooltip）。"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        name, ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load_node_module(module: str):
+    load_pack()
+    return importlib.import_module(f"{PACK_NAME}.{module}")
+
+
+def _percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _mad(sorted_vals) -> float:
+    """中位数绝对偏差（run-to-run 抖动的稳健估计）。"""
+    if not sorted_vals:
+        return 0.0
+    med = _percentile(sorted_vals, 0.5)
+    return _percentile(sorted(abs(v - med) for v in sorted_vals), 0.5)
+
+
+def _latency_stats(sorted_lat) -> dict:
+    return {
+        "p50_ms": round(_percentile(sorted_lat, 0.50) * 1000, 4),
+        "p90_ms": round(_percentile(sorted_lat, 0.90) * 1000, 4),
+        "p99_ms": round(_percentile(sorted_lat, 0.99) * 1000, 4),
+        "max_ms": round(sorted_lat[-1] * 1000, 4) if sorted_lat else 0.0,
+        "min_ms": round(sorted_lat[0] * 1000, 4) if sorted_lat else 0.0,
+        "mad_ms": round(_mad(sorted_lat) * 1000, 4),
+    }
+
+
+def _rss_peak_bytes() -> int:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def measure(fn, repeat: int = 20, warmup: int = 2, items_per_call: int = 1) -> dict:
+    """
+    运行 fn() 若干次并统计：
+    - 计时阶段不开 tracemalloc，避免拖慢被测代码
+    - 内存阶段单独跑一次，记录 Python 堆峰值（tracemalloc）与进程 RSS 峰值
+    - 中位数不到 1ms 的用例自动追加采样到 SUB_MS_MIN_SAMPLES 次（最多 SUB_MS_MAX_EXTRA_S 秒）
+    torch 张量走 c10 分配器，tracemalloc 看不到，需要张量字节数时由调用方另行统计。
+    """
+    for _ in range(warmup):
+        fn()
+
+    lat = []
+    t_all = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    if lat and _percentile(sorted(lat), 0.5) < 1e-3:
+        t_stop = time.perf_counter() + SUB_MS_MAX_EXTRA_S
+        while len(lat) < SUB_MS_MIN_SAMPLES and time.perf_counter() < t_stop:
+            t0 = time.perf_counter()
+            fn()
+            lat.append(time.perf_counter() - t0)
+    total = time.perf_counter() - t_all
+    calls = len(lat)
+
+    gc.collect()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    lat.sort()
+    return {
+        "calls": calls,
+        "items": calls * items_per_call,
+        "total_s": round(total, 6),
+        "throughput_items_per_s": round(calls * items_per_call / total, 3) if total > 0 else 0.0,
+        **_latency_stats(lat),
+        "py_peak_bytes": int(max(0, peak - base)),
+        "rss_peak_bytes": _rss_peak_bytes(),
+    }
+
+
+def measure_concurrent(fn, n_calls: int, workers: int) -> dict:
+    """
+    用线程池并发调用 fn(i)，i = 0..n_calls-1；返回统计与按 i 排列的结果列表 outputs。
+    """
+    lat = [0.0] * n_calls
+
+    def run(i):
+        t0 = time.perf_counter()
+        out = fn(i)
+        lat[i] = time.perf_counter() - t0
+        return out
+
+    t_all = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        outputs = list(ex.map(run, range(n_calls)))
+    total = time.perf_counter() - t_all
+    s = sorted(lat)
+    return {
+        "calls": n_calls,
+        "workers": workers,
+        "items": n_calls,
+        "total_s": round(total, 6),
+        "throughput_items_per_s": round(n_calls / total, 3) if total > 0 else 0.0,
+        **_latency_stats(s),
+        "py_peak_bytes": 0,
+        "rss_peak_bytes": _rss_peak_bytes(),
+        "outputs": outputs,
+    }
+
+
+def tensor_bytes(obj) -> int:
+    """递归统计输出里所有张量占用的字节数（dict / list / tuple）。"""
+    if hasattr(obj, "element_size") and hasattr(obj, "nelement"):
+        return int(obj.element_size() * obj.nelement())
+    if isinstance(obj, dict):
+        return sum(tensor_bytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(tensor_bytes(v) for v in obj)
+    return 0
+
+
+# ---------- 基线 ----------
+def save_baseline(results: dict, path: Path = DEFAULT_BASELINE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "results": results,
+    }
+    path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _latency_noise_ms(old: dict, cur: dict) -> float:
+    """延迟差的噪声下限：ABS_FLOOR_MS 与 k × MAD（两次运行取大者）中较大的一个。"""
+    return max(ABS_FLOOR_MS, MAD_K * max(old.get("mad_ms", 0.0), cur.get("mad_ms", 0.0)))
+
+
+def compare_to_baseline(results: dict, path: Path = DEFAULT_BASELINE, tolerance: float = 0.25):
+    """
+    与基线对比，返回回归列表 [(case, metric, baseline, current)]。
+    - p50_ms 变慢超过 tolerance，且差值超过噪声下限（0.1ms 与 3×MAD 取大）视为回归
+    - p99_ms 同上，但只在两次样本数都 ≥ P99_MIN_SAMPLES 时判定
+    - 吞吐下降超过 tolerance，且折算到每次调用的耗时差超过噪声下限视为回归
+    - Python 堆峰值增长超过 tolerance（且绝对值 > 64KB）视为回归
+    """
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    base = doc.get("results", {})
+    regressions = []
+    for case, cur in results.items():
+        old = base.get(case)
+        if not old:
+            continue
+        noise_ms = _latency_noise_ms(old, cur)
+        metrics = ["p50_ms"]
+        if min(old.get("calls", 0), cur.get("calls", 0)) >= P99_MIN_SAMPLES:
+            metrics.append("p99_ms")
+        for metric in metrics:
+            o, c = old.get(metric, 0), cur[metric]
+            if o > 0 and c > o * (1 + tolerance) and c - o > noise_ms:
+                regressions.append((case, metric, o, c))
+        t_old, t_cur = old.get("throughput_items_per_s", 0), cur["throughput_items_per_s"]
+        if t_old > 0 and t_cur < t_old * (1 - tolerance):
+            per_call_old = old.get("total_s", 0) * 1000 / max(1, old.get("calls", 1))
+            per_call_cur = cur["total_s"] * 1000 / max(1, cur.get("calls", 1))
+            if per_call_cur - per_call_old > noise_ms:
+                regressions.append((case, "throughput_items_per_s", t_old, t_cur))
+        m_old = old.get("py_peak_bytes", 0)
+        if cur["py_peak_bytes"] - m_old > 65536 and cur["py_peak_bytes"] > m_old * (1 + tolerance):
+            regressions.append((case, "py_peak_bytes", m_old, cur["py_peak_bytes"]))
+    return regressions
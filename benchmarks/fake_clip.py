@@ -0,0 +1,35 @@
+# benchmarks/fake_clip.py
+# 确定性的假 CLIP：接口与 ComfyUI 的 CLIP 对象一致（tokenize / encode_from_tokens），
+# 输出形状与 SD 系列文本编码器相同，数值由文本哈希决定，同一文本永远得到同一结果。
+
+import hashlib
+
+import torch
+
+
+class FakeClip:
+    def __init__(self, seq_len: int = 77, dim: int = 768, pooled_dim: int = 1280):
+        self.seq_len = seq_len
+        self.dim = dim
+        self.pooled_dim = pooled_dim
+        self.encode_calls = 0
+
+    @staticmethod
+    def _seed(text: str) -> int:
+        return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little") & 0x7FFFFFFFFFFFFFFF
+
+    def tokenize(self, text: str):
+        words = text.split()[: self.seq_len - 2]
+        ids = [49406] + [self._seed(w) % 49000 for w in words] + [49407]
+        ids += [49407] * (self.seq_len - len(ids))
+        # 与 ComfyUI 相同的结构：{encoder_name: [[(token, weight), ...]]}
+        return {"l": [[(t, 1.0) for t in ids]], "_text": text}
+
+    def encode_from_tokens(self, tokens, return_pooled: bool = False):
+        self.encode_calls += 1
+        g = torch.Generator(device="cpu").manual_seed(self._seed(tokens.get("_text", "")))
+        cond = torch.randn((1, self.seq_len, self.dim), generator=g)
+        if not return_pooled:
+            return cond
+        pooled = torch.randn((1, self.pooled_dim), generator=g)
+        return cond, pooled
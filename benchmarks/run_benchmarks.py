@@ -0,0 +1,706 @@
+# benchmarks/run_benchmarks.py
+# 节点包基准测试（离线可跑，不需要 ComfyUI / 网络）
+#
+#   python benchmarks/run_benchmarks.py                    # 跑全部用例，打印结果
+#   python benchmarks/run_benchmarks.py --quick            # 少量重复，快速冒烟
+#   python benchmarks/run_benchmarks.py --only composer    # 只跑名字包含 composer 的用例
+#   python benchmarks/run_benchmarks.py --save-baseline    # 写入 benchmarks/baselines/baseline.json
+#   python benchmarks/run_benchmarks.py --compare          # 与基线对比，有回归则退出码为 1
+#
+# 覆盖：
+#   AspectLatentSelector.build       批量 1~64
+#   SizeListLatentGenerator.build    列表长度 1~1000、批量 1~64
+#   latent_budget                    按内存预算拆分批量（拆分结果校验 + 分配开销）
+#   latent_noise                     带种子的高斯噪声：整批填充 vs 逐张生成（CPU，校验逐位一致）
+#   ByteDanceSeedreamSizeList.build  预设 + 自定义列表 1~1000
+#   PromptListStandalone.process_list  确定性假 CLIP
+#   DeepseekDualPromptComposer.compose 本地 stub 服务（延迟 / 错误注入 / 截止时间 / Interrupt）
+#   DeepseekDualPromptComposer.compose_many  打包请求：请求数 / 提示词字节 / 缺失补发
+#   composer_concurrency             数百个并发 compose：同一种子的请求内容必须逐字节一致
+#   batch_cli                        默认线程执行器 32 worker 跑完整批（逐条 / 打包）
+
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (DEFAULT_BASELINE, compare_to_baseline, load_node_module,  # noqa: E402
+                    measure, measure_concurrent, save_baseline, tensor_bytes)
+
+
+def _custom_sizes(n: int) -> str:
+    # 512~1024 之间循环取值，保证列表内尺寸各不相同（节点会去重）
+    out = []
+    for i in range(n):
+        w = 512 + (i % 33) * 16
+        h = 512 + (i // 33) * 16
+        out.append(f"{w}x{h}")
+    return "\n".join(out)
+
+
+# ---------- 用例 ----------
+def bench_aspect_latent(repeat: int):
+    mod = load_node_module("AspectLatentSelector")
+    node = mod.AspectLatentSelector()
+    results = {}
+    for batch in (1, 4, 16, 64):
+        fn = lambda: node.build("1:1 - 1328 x 1328", 批量张数=batch)  # noqa: E731
+        r = measure(fn, repeat=repeat, items_per_call=batch)
+        r["tensor_bytes"] = tensor_bytes(fn())
+        results[f"aspect_latent/batch{batch}"] = r
+    return results
+
+
+def bench_size_list_latent(repeat: int):
+    mod = load_node_module("SizeListLatentGenerator")
+    node = mod.SizeListLatentGenerator()
+    results = {}
+    for length, batch in ((1, 1), (10, 1), (100, 1), (1000, 1), (10, 8), (10, 64)):
+        text = _custom_sizes(length)
+        fn = lambda: node.build(选_1_1_1328x1328=False, 自定义尺寸=text, 每尺寸批量张数=batch)  # noqa: E731
+        r = measure(fn, repeat=max(1, repeat // (10 if length >= 1000 or batch >= 64 else 1)),
+                    items_per_call=length * batch)
+        r["tensor_bytes"] = tensor_bytes(fn()[0])
+        results[f"size_list_latent/len{length}_batch{batch}"] = r
+    return results
+
+
+def bench_latent_budget(repeat: int):
+    """
+    内存预算拆分：24 GiB 预算下 64 张的不同尺寸，校验每份估算不超预算、总张数不变，
+    校验 -1 自动预算扣除推理保留与待加载的模型权重，并对比开启预算前后 SizeListLatentGenerator 的耗时。
+    """
+    lb = load_node_module("latent_budget")
+    node = load_node_module("SizeListLatentGenerator").SizeListLatentGenerator()
+    budget_mb = 24576
+    budget = budget_mb * lb.MB
+    for w, h in ((4096, 4096), (928, 1664), (1328, 1328), (512, 512)):
+        chunks = lb.split_batch(w, h, 64, budget)
+        assert sum(chunks) == 64 and max(chunks) - min(chunks) <= 1, chunks
+        assert lb.estimate_bytes(w, h, max(chunks))["sample"] <= budget, (w, h, chunks)
+    assert len(lb.split_batch(4096, 4096, 64, budget)) > 1
+    assert lb.split_batch(512, 512, 64, budget) == [64]
+    _check_auto_budget(lb)
+
+    results = {}
+    text = "928x1664\n4096x4096"
+    for name, mb in (("off", 0), ("24gib", budget_mb)):
+        fn = lambda: node.build(选_1_1_1328x1328=False, 自定义尺寸=text,  # noqa: E731
+                                每尺寸批量张数=64, 采样内存预算_MB=mb)
+        r = measure(fn, repeat=max(1, repeat // 10), items_per_call=128)
+        out = fn()
+        r["list_items"] = out[2]
+        r["max_item_sample_bytes"] = max(lb.estimate_bytes(w, h, l["samples"].shape[0])["sample"]
+                                         for l, (w, h) in zip(out[0], out[1]))
+        results[f"latent_budget/928x1664+4096x4096_batch64_{name}"] = r
+    return results
+
+
+def _check_auto_budget(lb):
+    """-1 自动预算：空闲显存扣掉推理保留与同设备模型被卸载的部分（假的 model_management）。"""
+    from types import SimpleNamespace
+
+    gib = 1024 * lb.MB
+    offloaded = SimpleNamespace(device="cuda:0", model_offloaded_memory=lambda: 6 * gib)
+    legacy = SimpleNamespace(device="cuda:0", model_memory=lambda: 5 * gib, model_loaded_memory=lambda: 3 * gib)
+    other = SimpleNamespace(device="cpu", model_offloaded_memory=lambda: 50 * gib)
+    fake = SimpleNamespace(
+        get_torch_device=lambda: "cuda:0", get_free_memory=lambda dev: 20 * gib,
+        minimum_inference_memory=lambda: 1 * gib, current_loaded_models=[offloaded, legacy, other],
+    )
+    saved = lb._mm
+    try:
+        lb._mm = fake
+        assert lb.resolve_budget(-1) == 11 * gib, lb.resolve_budget(-1)
+        fake.current_loaded_models = []
+        assert lb.resolve_budget(-1) == 19 * gib
+        fake.get_free_memory = lambda dev: gib // 2
+        assert lb.resolve_budget(-1) == lb.MB  # 扣成负数时仍是一个很小的预算，而不是「不限制」
+        lb._mm = None
+        assert lb.resolve_budget(-1) == 0
+    finally:
+        lb._mm = saved
+
+
+def bench_latent_noise(repeat: int):
+    """
+    gaussian 噪声 latent：整批预分配 + 逐张设种子填充（节点实现）对比逐张生成再 torch.cat，
+    并校验两者、开启内存预算拆分后的节点输出以及 NOISE 输出与单张参考实现逐位一致。
+    """
+    import torch
+
+    ln = load_node_module("latent_noise")
+    aspect = load_node_module("AspectLatentSelector").AspectLatentSelector()
+    size_list = load_node_module("SizeListLatentGenerator").SizeListLatentGenerator()
+    c, lh, lw = 4, 166, 166  # 1328 x 1328
+    results = {}
+    for batch in (1, 8, 64):
+        seeds = ln.item_seeds(123456789, 0, batch)
+        batched = lambda: ln.make_latent(batch, c, lh, lw, "gaussian", seeds)  # noqa: E731
+        per_item = lambda: torch.cat([ln.single_noise(c, lh, lw, s) for s in seeds])  # noqa: E731
+        assert torch.equal(batched(), per_item()), "整批填充与逐张生成结果不一致"
+        for name, fn in (("batched", batched), ("per_item_cat", per_item)):
+            r = measure(fn, repeat=max(1, repeat // (10 if batch >= 64 else 1)), items_per_call=batch)
+            r["tensor_bytes"] = tensor_bytes(fn())
+            results[f"latent_noise/{name}_batch{batch}"] = r
+
+    # 节点输出：拆分（24 份以内）不改变任何一张图的噪声
+    latents, _, seed_list, noises = aspect.build("1:1 - 1328 x 1328", 批量张数=16, 采样内存预算_MB=4096,
+                                                 噪声模式="gaussian", 噪声种子=99)
+    flat = torch.cat([l["samples"] for l in latents])
+    assert len(latents) > 1 and seed_list == ln.item_seeds(99, 0, 16)
+    assert all(torch.equal(flat[i:i + 1], ln.single_noise(c, lh, lw, s)) for i, s in enumerate(seed_list))
+    out = size_list.build(选_1_1_1328x1328=True, 自定义尺寸="928x1664", 每尺寸批量张数=3,
+                          噪声模式="gaussian", 噪声种子=7)
+    assert out[4] == [7, 8, 9, 10, 11, 12]
+    assert torch.equal(out[0][1]["samples"][2:3], ln.single_noise(4, 208, 116, 12))
+
+    # NOISE 输出：与 gaussian latent 逐位一致；zeros 模式同样输出；形状 / 通道数跟随采样时的 latent
+    assert len(noises) == len(latents)
+    assert all(torch.equal(n.generate_noise(l), l["samples"]) for n, l in zip(noises, latents))
+    zeros_out = size_list.build(选_1_1_1328x1328=True, 自定义尺寸="928x1664", 每尺寸批量张数=3, 噪声种子=7)
+    assert zeros_out[4] == [] and [n.seed for n in zeros_out[5]] == [7, 10]
+    assert all(torch.equal(n.generate_noise(zl), l["samples"])
+               for n, zl, l in zip(zeros_out[5], zeros_out[0], out[0]))
+    flow = {"samples": torch.zeros((2, 16, 8, 8), dtype=torch.bfloat16)}
+    noise = zeros_out[5][1].generate_noise(flow)
+    assert noise.shape == (2, 16, 8, 8) and noise.dtype == torch.bfloat16
+    assert torch.equal(noise[1:2], ln.single_noise(16, 8, 8, 11).to(torch.bfloat16))
+    picked = zeros_out[5][0].generate_noise({"samples": torch.zeros((2, 4, 8, 8)), "batch_index": [3, 5]})
+    assert torch.equal(picked[1:2], ln.single_noise(4, 8, 8, 12))
+    return results
+
+
+def bench_seedream_size_list(repeat: int):
+    mod = load_node_module("ByteDanceSeedreamSizeList")
+    node = mod.ByteDanceSeedreamSizeList()
+    results = {}
+
+    all_presets = {"选_" + re.sub(r"[^\d]+", "_", label).strip("_"): True for label, _, _ in node.PRESETS}
+    fn = lambda: node.build(**all_presets)  # noqa: E731
+    results["seedream_size_list/all_presets"] = measure(fn, repeat=repeat * 5, items_per_call=len(node.PRESETS))
+
+    for length in (1, 10, 100, 1000):
+        text = _custom_sizes(length)
+        fn = lambda: node.build(自定义尺寸=text)  # noqa: E731
+        results[f"seedream_size_list/custom{length}"] = measure(fn, repeat=repeat, items_per_call=length + 1)
+    return results
+
+
+def bench_prompt_list(repeat: int):
+    from fake_clip import FakeClip
+
+    mod = load_node_module("PromptListStandalone")
+    node = mod.PromptListStandalone()
+    clip = FakeClip()
+    prompts = {f"prompt_{i}": f"a cinematic poster of summer tides, variant {i}, film grain" for i in range(1, 11)}
+    results = {}
+    # process_list 每次调用都会 print，计时循环里吞掉 stdout，免得测到终端 I/O
+    with contextlib.redirect_stdout(io.StringIO()):
+        for count in (1, 5, 10):
+            fn = lambda: node.process_list(count, **prompts)  # noqa: E731
+            results[f"prompt_list/no_clip_count{count}"] = measure(fn, repeat=repeat * 5, items_per_call=count)
+            fn = lambda: node.process_list(count, clip=clip, **prompts)  # noqa: E731
+            r = measure(fn, repeat=repeat, items_per_call=count)
+            r["tensor_bytes"] = tensor_bytes(fn()[1])
+            results[f"prompt_list/fake_clip_count{count}"] = r
+        # 确定性检查：同一文本两次编码结果一致
+        a = node.process_list(1, clip=clip, **prompts)[1][0][0]
+        b = node.process_list(1, clip=clip, **prompts)[1][0][0]
+    assert bool((a == b).all()), "FakeClip 输出不确定"
+    return results
+
+
+def bench_composer(repeat: int):
+    from stub_llm_server import StubLLMServer
+
+    mod = load_node_module("DeepseekDualPromptComposer")
+    results = {}
+    for latency, error_rate in ((0.0, 0.0), (0.02, 0.0), (0.0, 0.1), (0.02, 0.1)):
+        with StubLLMServer(latency=latency, error_rate=error_rate, seed=1234) as srv:
+            node = mod.DeepseekDualPromptComposer()
+            node.API_URLS = srv.api_urls()
+            outputs = []
+
+            def fn():
+                with contextlib.redirect_stdout(io.StringIO()):  # 节点每次都会打印种子，这里静音
+                    out = node.compose(
+                        "system instruction", "summer beach at sunset", "SUMMER TIDES", 42,
+                        "sk-bench", "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                        auto_random_seed=False,
+                    )
+                outputs.append(out)
+                return out
+
+            r = measure(fn, repeat=repeat)
+            r["server_requests"] = len(srv.requests)
+            r["error_outputs"] = sum(1 for bg, _ in outputs if bg.startswith("Error:"))
+            r["latency_s"] = latency
+            r["error_rate"] = error_rate
+            results[f"composer/lat{int(latency * 1000)}ms_err{int(error_rate * 100)}pct"] = r
+
+    # 截止时间：服务端 2s 才响应，0.5s 预算应按时返回降级结果
+    with StubLLMServer(latency=2.0) as srv:
+        node = mod.DeepseekDualPromptComposer()
+        node.API_URLS = srv.api_urls()
+
+        def fn():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return node.compose(
+                    "system instruction", "deadline topic", "DEADLINE", 7,
+                    "sk-bench", "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                    auto_random_seed=False, timeout_budget=0.5, on_timeout="error",
+                )
+
+        r = measure(fn, repeat=max(2, repeat // 4), warmup=0)
+        assert fn()[0].startswith("Error: deadline exceeded"), "截止时间未生效"
+        assert r["max_ms"] < 1500, r
+        results["composer/deadline_0.5s_vs_2s_server"] = r
+
+    # 退避不够预算时不再空等：一直 500 的服务端，2s 预算、5 次重试应返回真实的 500，而不是「超时」/ 旧结果
+    with StubLLMServer(error_rate=1.0, error_status=500) as srv:
+        node = mod.DeepseekDualPromptComposer()
+        node.API_URLS = srv.api_urls()
+
+        def fn():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return node.compose(
+                    "system instruction", "always 500 topic", "ALWAYS 500", 9,
+                    "sk-bench", "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                    auto_random_seed=False, timeout_budget=2.0, max_retries=5, on_timeout="last_good",
+                )
+
+        r = measure(fn, repeat=max(2, repeat // 4), warmup=0)
+        out = fn()[0]
+        assert out.startswith("Error: DeepSeek API Error: 500"), out
+        assert r["max_ms"] < 2000, r
+        results["composer/always500_2s_budget_5retries"] = r
+
+    results.update(_bench_composer_cancel(mod, repeat))
+    return results
+
+
+class _FakeInterrupt(Exception):
+    pass
+
+
+class _FakeModelManagement:
+    """
+    代替 comfy.model_management 的中断接口：after_s 秒后「按下 Interrupt」。
+    raise_on_throw=True 时与 ComfyUI 一样在 throw_exception_if_processing_interrupted() 里抛出并清掉标记；
+    False 时模拟标记已被清掉（只记录调用），节点应退回 "Error: cancelled"。
+    """
+
+    def __init__(self, after_s: float, raise_on_throw: bool):
+        self.flip_at = time.monotonic() + after_s
+        self.raise_on_throw = raise_on_throw
+        self.throw_calls = 0
+
+    def processing_interrupted(self) -> bool:
+        return self.flip_at is not None and time.monotonic() >= self.flip_at
+
+    def throw_exception_if_processing_interrupted(self):
+        self.throw_calls += 1
+        if self.raise_on_throw and self.processing_interrupted():
+            self.flip_at = None
+            raise _FakeInterrupt()
+
+
+def _bench_composer_cancel(mod, repeat: int):
+    """
+    Interrupt：服务端 5s 才响应，0.3s 后按下中断，compose 应在 ~0.3s 内返回，不等请求 / 预算结束。
+    分别检查交回 ComfyUI 的中断异常与标记已清掉时的 "Error: cancelled" 两条路径。
+    """
+    from stub_llm_server import StubLLMServer
+
+    dh = load_node_module("deadline_http")
+    results = {}
+    with StubLLMServer(latency=5.0) as srv:
+        node = mod.DeepseekDualPromptComposer()
+        node.API_URLS = srv.api_urls()
+        saved = dh._mm
+        try:
+            for raise_on_throw in (True, False):
+                fakes = []
+
+                def fn():
+                    fake = dh._mm = _FakeModelManagement(0.3, raise_on_throw)  # noqa: B023
+                    fakes.append(fake)
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            out = node.compose(
+                                "system instruction", "cancel topic", "CANCEL", 11,
+                                "sk-bench", "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                                auto_random_seed=False, timeout_budget=30.0, on_timeout="last_good",
+                            )
+                    except _FakeInterrupt:
+                        return "interrupt"
+                    return out[0]
+
+                r = measure(fn, repeat=max(2, repeat // 4), warmup=0)
+                out = fn()
+                expect = "interrupt" if raise_on_throw else "Error: cancelled"
+                assert out == expect, (raise_on_throw, out)
+                assert all(f.throw_calls >= 1 for f in fakes), "Cancelled 没有交回 ComfyUI"
+                assert r["max_ms"] < 1000, r
+                name = "raise_interrupt" if raise_on_throw else "error_cancelled"
+                results[f"composer/cancel_0.3s_vs_5s_server_{name}"] = r
+        finally:
+            dh._mm = saved
+    return results
+
+
+def bench_key_pool(repeat: int):
+    """
+    多 key 池：stub 按 key 限流（每 key 每 0.5s 5 次），4 个 key 中 1 个无效。
+    对比单 key 与 key 池在 8 线程并发下的吞吐 / 失败数，并检查 key 不会出现在输出里；
+    另跑一遍不回传额度头的 stub（与 DeepSeek 一致），检查每个 key 在 429 冷却后都会被再次使用。
+    """
+    import os
+    from collections import Counter
+
+    from stub_llm_server import StubLLMServer
+
+    mod = load_node_module("DeepseekDualPromptComposer")
+    good = [f"sk-bench-good-{i}-0123456789" for i in range(3)]
+    bad = "sk-bench-bad-0123456789"
+    env_name = "VISIOSTAR_BENCH_KEYS"
+    n_calls = max(24, repeat * 8)
+    results = {}
+
+    # 池本身：一次 429 冷却结束后（无额度头），该 key 应重新参与轮转
+    pool = load_node_module("api_key_pool").ApiKeyPool(["k1", "k2", "k3"])
+    ks = pool.acquire()
+    pool.release(ks, 429, 0.01, {"retry-after": "0.05"})
+    time.sleep(0.08)
+    picks = Counter()
+    for _ in range(300):
+        ks = pool.acquire()
+        picks[ks.label] += 1
+        pool.release(ks, 200, 0.01, {})
+    assert min(picks[f"key#{i}"] for i in (1, 2, 3)) >= 50, picks
+    held = [pool.acquire() for _ in range(6)]
+    assert {k.label for k in held} == {"key#1", "key#2", "key#3"}, held
+    lines = pool.describe()
+    assert len(lines) == 3 and all(line.startswith(f"key#{i}:") for i, line in enumerate(lines, 1)), lines
+
+    for rate_headers, cases in ((True, (("single_key", {}), ("pool_4keys_1bad", {"api_key_env": env_name}))),
+                                (False, (("pool_4keys_1bad_noheaders", {"api_key_env": env_name + "_NH"}),))):
+        with StubLLMServer(latency=0.01, rate_limit=5, rate_window=0.5, bad_keys={bad},
+                           rate_headers=rate_headers) as srv:
+            results.update(_run_key_pool_cases(mod.DeepseekDualPromptComposer, srv, cases, good, bad, n_calls))
+            if not rate_headers:
+                hit = [k for k in good if srv.key_429.get(k)]
+                assert hit, "stub 没有触发 429，校验不成立"
+                assert all(srv.key_ok_after_429.get(k, 0) > 0 for k in hit), (
+                    dict(srv.key_429), dict(srv.key_ok_after_429))
+        for _, kwargs in cases:
+            os.environ.pop(kwargs.get("api_key_env", ""), None)
+
+    for name in ("pool_4keys_1bad", "pool_4keys_1bad_noheaders"):
+        r = results[f"key_pool/{name}"]
+        assert r["error_outputs"] == 0, r
+        assert min(r["per_key_requests"].values()) > 0, r["per_key_requests"]
+    return results
+
+
+def _run_key_pool_cases(node_cls, srv, cases, good, bad, n_calls):
+    """bench_key_pool 的一组对比：每个 case 在 8 线程下并发 compose，统计失败数与各 key 的请求数。"""
+    import os
+
+    node = node_cls()
+    node.API_URLS = srv.api_urls()
+
+    def make_fn(**pool_kwargs):
+        def fn(i):
+            return node.compose(
+                "system instruction", f"topic {i}", f"TITLE {i}", i,
+                good[0], "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                auto_random_seed=False, timeout_budget=10.0, max_retries=4, on_timeout="error",
+                **pool_kwargs,
+            )
+        return fn
+
+    results = {}
+    for name, kwargs in cases:
+        if kwargs.get("api_key_env"):
+            os.environ[kwargs["api_key_env"]] = "\n".join(good + [bad])
+        before = dict(srv.key_counts)
+        # redirect_stdout 改的是全局 sys.stdout，只能包在并发区外面
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = measure_concurrent(make_fn(**kwargs), n_calls, workers=8)
+        outputs = r.pop("outputs")
+        r["error_outputs"] = sum(1 for bg, _ in outputs if bg.startswith("Error:"))
+        r["per_key_requests"] = {f"key#{i + 1}": srv.key_counts.get(k, 0) - before.get(k, 0)
+                                 for i, k in enumerate(good)}
+        flat = "".join(a + b for a, b in outputs)
+        assert not any(k in flat for k in good + [bad]), "key 出现在了输出中"
+        results[f"key_pool/{name}"] = r
+    return results
+
+
+def bench_packing(repeat: int):
+    """
+    打包模式：32 组主题/标题，逐条请求（pack 1）与每请求 8 组（pack 8）对比
+    请求数、每条分摊的提示词字节与吞吐；stub 丢弃/写坏部分条目，校验补发后全部有结果。
+    """
+    from stub_llm_server import StubLLMServer
+
+    mod = load_node_module("DeepseekDualPromptComposer")
+    instruction = mod.DeepseekDualPromptComposer.INPUT_TYPES()["required"]["instruction"][1]["default"]
+    n = 32
+    pairs = [(f"topic {i}", f"TITLE {i}") for i in range(n)]
+    seeds = [1000 + i for i in range(n)]
+    results = {}
+
+    for pack_size in (1, 8):
+        with StubLLMServer(latency=0.01, pack_drop_every=5) as srv:
+            node = mod.DeepseekDualPromptComposer()
+            node.API_URLS = srv.api_urls()
+
+            def fn():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if pack_size == 1:
+                        return [node.compose(instruction, t, ti, s, "sk-bench", "deepseek", "deepseek-chat",
+                                             0.7, 512, 0.7, auto_random_seed=False)
+                                for (t, ti), s in zip(pairs, seeds)]
+                    return node.compose_many(instruction, pairs, seeds, "sk-bench", "deepseek",
+                                             "deepseek-chat", 0.7, 512, 0.7, pack_size=pack_size)
+
+            outputs = fn()  # 首轮：stub 会丢弃/写坏部分条目，统计含补发的请求数
+            sent = list(srv.requests)
+            assert len(outputs) == n and not any(bg.startswith("Error:") for bg, _ in outputs), outputs
+            r = measure(fn, repeat=max(2, repeat // 2), warmup=0, items_per_call=n)
+            r["requests_per_batch"] = len(sent)
+            r["prompt_bytes_per_item"] = round(
+                sum(len(json.dumps(p["messages"], ensure_ascii=False).encode("utf-8")) for p in sent) / n, 1)
+            results[f"packing/pack{pack_size}_{n}items"] = r
+
+    one, eight = results[f"packing/pack1_{n}items"], results[f"packing/pack8_{n}items"]
+    assert eight["requests_per_batch"] < one["requests_per_batch"], (one, eight)
+    assert eight["prompt_bytes_per_item"] < one["prompt_bytes_per_item"], (one, eight)
+    return results
+
+
+def bench_composer_concurrency(repeat: int):
+    """
+    并发压力：32 线程同时跑 400 次 compose（50 个种子 × 8 次），另有线程不停改写全局 random 状态，
+    模拟同进程里其他节点/库的干扰；线程切换间隔调到 1µs。
+    校验每个种子发出的 payload 与单线程参考完全一致、输出一致。
+    """
+    import random
+    import threading
+
+    from stub_llm_server import StubLLMServer
+
+    mod = load_node_module("DeepseekDualPromptComposer")
+    n_seeds, per_seed = 50, 8
+    n_calls = max(n_seeds * per_seed, repeat * 20)
+
+    def canonical(payload):
+        return json.dumps(payload, ensure_ascii=False, sort_keys=True)
+
+    with StubLLMServer(latency=0.005, jitter=0.01) as srv:
+        node = mod.DeepseekDualPromptComposer()
+        node.API_URLS = srv.api_urls()
+
+        def fn(i):
+            seed = 1000 + i % n_seeds
+            return node.compose(
+                "system instruction", f"topic {seed}", f"TITLE {seed}", seed,
+                "sk-bench", "deepseek", "deepseek-chat", 0.7, 512, 0.7,
+                auto_random_seed=False, timeout_budget=10.0,
+            )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            reference = {1000 + k: fn(k) for k in range(n_seeds)}
+        ref_payloads = {p["seed"]: canonical(p) for p in srv.requests}
+        del srv.requests[:]
+
+        stop = threading.Event()
+
+        def scramble():
+            r = 0
+            while not stop.is_set():
+                random.seed(r)
+                random.random()
+                r += 1
+
+        noise = threading.Thread(target=scramble, daemon=True)
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # 频繁切换线程，让「设种子 → 取随机数」之间的竞争窗口真正暴露出来
+        noise.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = measure_concurrent(fn, n_calls, workers=32)
+        finally:
+            stop.set()
+            noise.join()
+            sys.setswitchinterval(switch)
+
+        outputs = r.pop("outputs")
+        seen = {}
+        for p in srv.requests:
+            seen.setdefault(p["seed"], set()).add(canonical(p))
+        bad = [s for s, v in seen.items() if v != {ref_payloads[s]}]
+        assert not bad, f"种子 {bad[:5]} 的请求内容与单线程参考不一致"
+        assert len(srv.requests) == n_calls, (len(srv.requests), n_calls)
+        assert all(out == reference[1000 + i % n_seeds] for i, out in enumerate(outputs))
+        r["distinct_payloads"] = sum(len(v) for v in seen.values())
+    return {f"composer_concurrency/{n_calls}calls_32threads": r}
+
+
+def bench_batch_cli(repeat: int):
+    """
+    batch_cli 默认（线程）执行器：32 个 worker、按需启动的线程并发处理 400 条，逐条与打包各跑一遍，
+    校验退出码为 0、每个 id 恰好一条成功记录。
+    """
+    import tempfile
+
+    from stub_llm_server import StubLLMServer
+
+    cli = load_node_module("batch_cli")
+    assert cli.build_parser().get_default("executor") == "thread"
+    n_items = max(400, repeat * 40)
+    results = {}
+    with StubLLMServer(latency=0.005, jitter=0.01) as srv, tempfile.TemporaryDirectory() as d:
+        src = Path(d) / "items.jsonl"
+        src.write_text("".join(json.dumps({"id": f"it-{i}", "topic": f"topic {i}", "title": f"T{i}",
+                                           "sizes": "1024x1536"}) + "\n" for i in range(n_items)),
+                       encoding="utf-8")
+        for pack in (1, 8):
+            out = Path(d) / f"out_{pack}.jsonl"
+            argv = ["-i", str(src), "-o", str(out), "--overwrite", "--base-url", srv.url,
+                    "--workers", "32", "--pack-size", str(pack)]
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                r = measure(lambda: cli.main(argv), repeat=1, warmup=0, items_per_call=n_items)  # noqa: B023
+                code = cli.main(argv)
+            recs = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+            assert code == 0, code
+            assert sorted(rec["id"] for rec in recs) == sorted(f"it-{i}" for i in range(n_items))
+            assert not any(rec.get("error") for rec in recs)
+            results[f"batch_cli/threads32_pack{pack}_{n_items}items"] = r
+    return results
+
+
+def bench_profiling(repeat: int):
+    """
+    埋点开销：同一节点在 关闭 / 开启 / 开启+内存峰值 三种状态下的耗时，
+    校验 trace 文件可被解析、增量落盘只追加新事件、调用结束后 tracemalloc 已关闭。
+    """
+    import tempfile
+    import tracemalloc
+
+    from fake_clip import FakeClip
+
+    prof = load_node_module("profiling")
+    mod = load_node_module("PromptListStandalone")
+    node = mod.PromptListStandalone()
+    clip = FakeClip()
+    prompts = {f"prompt_{i}": f"poster variant {i}" for i in range(1, 6)}
+    fn = lambda: node.process_list(5, clip=clip, **prompts)  # noqa: E731
+
+    results = {}
+    # process_list 每次调用都会 print，整组用例里吞掉 stdout，免得测到终端 I/O
+    with contextlib.redirect_stdout(io.StringIO()):
+        was_enabled, was_mem = prof.enabled(), prof.mem_enabled()
+        prof.disable()
+        results["profiling/disabled"] = measure(fn, repeat=repeat * 5, items_per_call=5)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = str(Path(d) / "trace.json")
+            try:
+                for name, mem in (("enabled", False), ("enabled_mem", True)):
+                    prof.clear()
+                    prof.enable(path, mem=mem)
+                    results[f"profiling/{name}"] = measure(fn, repeat=repeat * 5, items_per_call=5)
+                    fn()  # measure 的内存阶段自带 tracemalloc，这里单独调用一次，检查埋点自身的开关
+                    assert not tracemalloc.is_tracing(), "埋点结束后 tracemalloc 仍在运行"
+                    prof.write_trace(path)
+                    events = prof.read_trace(path)
+                    nodes = [e for e in events if e["name"] == "PromptListStandalone.process_list"]
+                    assert nodes and ("tracemalloc_peak_bytes" in nodes[-1]["args"]) == mem, nodes[-1:]
+                    # 增量落盘：再调用一次只追加这一次调用的事件
+                    fn()
+                    prof.write_trace(path)
+                    added = prof.read_trace(path)[len(events):]
+                    assert [e["name"] for e in added][-1:] == ["PromptListStandalone.process_list"], added
+                    assert sum(e["name"] == "PromptListStandalone.process_list" for e in added) == 1, added
+            finally:
+                prof.disable()
+                prof.clear()
+        names = {e["name"] for e in events}
+        assert {"PromptListStandalone.process_list", "clip_encode"} <= names, names
+    prof.enable(mem=was_mem)
+    if not was_enabled:
+        prof.disable()
+    return results
+
+
+CASES = {
+    "aspect_latent": bench_aspect_latent,
+    "size_list_latent": bench_size_list_latent,
+    "latent_budget": bench_latent_budget,
+    "latent_noise": bench_latent_noise,
+    "seedream_size_list": bench_seedream_size_list,
+    "prompt_list": bench_prompt_list,
+    "composer": bench_composer,
+    "key_pool": bench_key_pool,
+    "packing": bench_packing,
+    "composer_concurrency": bench_composer_concurrency,
+    "batch_cli": bench_batch_cli,
+    "profiling": bench_profiling,
+}
+
+
+def _print_table(results: dict):
+    cols = ("p50_ms", "p90_ms", "p99_ms", "throughput_items_per_s", "py_peak_bytes", "rss_peak_bytes")
+    width = max(len(k) for k in results) if results else 10
+    print(f"{'case':<{width}}  " + "  ".join(f"{c:>22}" for c in cols))
+    for name, r in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{r.get(c, ''):>22}" for c in cols))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="tooltip 节点包基准测试")
+    ap.add_argument("--only", action="append", default=[], help="只跑名字包含该子串的用例组（可多次）")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--quick", action="store_true", help="快速模式（repeat=3）")
+    ap.add_argument("--json", type=Path, help="把结果另存为 JSON")
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, type=Path)
+    ap.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, type=Path)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="回归判定阈值（比例）")
+    args = ap.parse_args(argv)
+
+    repeat = 3 if args.quick else max(1, args.repeat)
+    results = {}
+    for name, fn in CASES.items():
+        if args.only and not any(s in name for s in args.only):
+            continue
+        print(f"[bench] {name} ...", flush=True)
+        results.update(fn(repeat))
+
+    _print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+        print(f"[bench] baseline saved -> {args.save_baseline}")
+    if args.compare:
+        regressions = compare_to_baseline(results, args.compare, args.tolerance)
+        for case, metric, old, new in regressions:
+            print(f"[bench] REGRESSION {case} {metric}: {old} -> {new}")
+        if regressions:
+            return 1
+        print("[bench] no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# benchmarks/stub_llm_server.py
+# 本地 OpenAI 兼容 stub 服务（仅标准库），用于离线压测 DeepseekDualPromptComposer
+# - POST /chat/completions 与 /v1/chat/completions
+# - 可配置固定延迟 + 抖动、按比例注入错误（状态码可选）
+# - 可按 key 限流（滑动窗口，超限返回 429 + Retry-After）、指定无效 key（401）
+#   rate_headers=False 时不回传 x-ratelimit-remaining-requests（与 DeepSeek 一致）
+# - 返回内容由请求消息的哈希确定，同一请求总是得到同一结果
+# - 打包请求（user 消息含 "ITEMS:" + JSON 数组）返回 {"items": [{id, bg, typo}, ...]}；
+#   pack_drop_every=N 时每个条目第一次出现且序号为 N 的倍数会被丢弃/写坏，用于验证补发
+#
+# 单独运行：python benchmarks/stub_llm_server.py --port 8765 --latency 0.05 --error-rate 0.1
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # 静默，避免刷屏
+        pass
+
+    def _send_json(self, status: int, obj: dict, headers: dict = None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            payload = json.loads(raw or b"{}")
+        except Exception:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+
+        auth = self.headers.get("Authorization") or ""
+        key = auth[7:].strip() if auth.startswith("Bearer ") else auth.strip()
+        stub._record(payload)
+        status, limit_headers = stub._admit(key)
+        if status != 200:
+            self._send_json(status, {"error": {"message": "rate limited" if status == 429 else "invalid key"}},
+                            limit_headers)
+            return
+
+        delay, error = stub._draw()
+        if delay > 0:
+            time.sleep(delay)
+        if error:
+            self._send_json(stub.error_status, {"error": {"message": "injected error", "code": stub.error_status}},
+                            limit_headers)
+            return
+
+        content = stub.make_content(payload)
+        self._send_json(200, {
+            "id": "stub-" + hashlib.sha1(raw).hexdigest()[:12],
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(content) // 4},
+        }, limit_headers)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # 默认 backlog 只有 5，并发压测时会触发 1s/2s 的 SYN 重传
+
+    def handle_error(self, request, client_address):
+        # 客户端超时/取消后主动断开属于预期情况（截止时间、中断测试），不打印堆栈
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubLLMServer:
+    """
+    用法：
+        with StubLLMServer(latency=0.02, error_rate=0.1) as srv:
+            node.API_URLS = srv.api_urls()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, seed: int = 0,
+                 rate_limit: int = 0, rate_window: float = 1.0, bad_keys=(),
+                 pack_drop_every: int = 0, rate_headers: bool = True):
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = []
+        self.rate_limit = int(rate_limit)  # 每个 key 在 rate_window 秒内允许的请求数，0 = 不限
+        self.rate_window = float(rate_window)
+        self.bad_keys = set(bad_keys)
+        self.key_counts = defaultdict(int)  # 成功放行的请求数
+        self.key_429 = defaultdict(int)
+        self.key_ok_after_429 = defaultdict(int)  # 该 key 第一次 429 之后又成功放行的请求数
+        self.rate_headers = bool(rate_headers)
+        self._windows = defaultdict(deque)
+        self.pack_drop_every = int(pack_drop_every)
+        self._pack_seen = set()
+        self._pack_count = 0
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread = None
+
+    # ---- 生命周期 ----
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def api_urls(self) -> dict:
+        return {
+            "deepseek": self.url + "/chat/completions",
+            "siliconflow": self.url + "/v1/chat/completions",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- 内部 ----
+    def _record(self, payload: dict):
+        with self._lock:
+            self.requests.append(payload)
+
+    def _admit(self, key: str):
+        """返回 (状态码, 限流响应头)。"""
+        if key in self.bad_keys:
+            return 401, {}
+        if self.rate_limit <= 0:
+            with self._lock:
+                self.key_counts[key] += 1
+            return 200, {}
+        now = time.monotonic()
+        with self._lock:
+            win = self._windows[key]
+            while win and now - win[0] >= self.rate_window:
+                win.popleft()
+            if len(win) >= self.rate_limit:
+                self.key_429[key] += 1
+                retry = max(0.05, self.rate_window - (now - win[0]))
+                headers = {"Retry-After": f"{retry:.2f}"}
+                if self.rate_headers:
+                    headers["x-ratelimit-remaining-requests"] = 0
+                return 429, headers
+            win.append(now)
+            self.key_counts[key] += 1
+            if self.key_429[key]:
+                self.key_ok_after_429[key] += 1
+            if not self.rate_headers:
+                return 200, {}
+            return 200, {"x-ratelimit-remaining-requests": self.rate_limit - len(win)}
+
+    def _draw(self):
+        with self._lock:
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+            error = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return delay, error
+
+    def make_content(self, payload: dict) -> str:
+        """由最后一条 user 消息确定性地生成 {bg, typo} JSON。"""
+        msgs = payload.get("messages") or []
+        user = next((m.get("content", "") for m in reversed(msgs) if m.get("role") == "user"), "")
+        items = self._packed_items(user)
+        if items is not None:
+            return self._make_packed_content(items)
+        h = hashlib.sha256(user.encode("utf-8")).hexdigest()[:8]
+        return json.dumps(self._result(h), ensure_ascii=False)
+
+    @staticmethod
+    def _result(h: str) -> dict:
+        return {
+            "bg": f"stub background {h}, cinematic light, film grain, detailed textures",
+            "typo": f"stub typography {h}, bold sans-serif title, centered, generous whitespace",
+        }
+
+    @staticmethod
+    def _packed_items(user: str):
+        if "ITEMS:" not in user:
+            return None
+        try:
+            items = json.loads(user.split("ITEMS:", 1)[1].strip())
+        except Exception:
+            return None
+        if isinstance(items, list) and all(isinstance(it, dict) and "id" in it for it in items):
+            return items
+        return None
+
+    def _make_packed_content(self, items) -> str:
+        out = []
+        for it in items:
+            # 结果只取决于条目本身（主题/标题/变体），与同包的其他条目和包内编号无关
+            ident = json.dumps([it.get("theme"), it.get("title"), it.get("variant")], ensure_ascii=False)
+            h = hashlib.sha256(ident.encode("utf-8")).hexdigest()[:8]
+            if self.pack_drop_every > 0:
+                with self._lock:
+                    first = ident not in self._pack_seen
+                    self._pack_seen.add(ident)
+                    self._pack_count += 1
+                    drop = first and self._pack_count % self.pack_drop_every == 0
+                if drop:
+                    if self._pack_count % (2 * self.pack_drop_every) == 0:
+                        out.append({"id": it["id"], "bg": "", "typo": None})  # 写坏
+                    continue  # 丢失
+            out.append({"id": it["id"], **self._result(h)})
+        return json.dumps({"items": out}, ensure_ascii=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="OpenAI 兼容的本地 stub 服务")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="固定延迟（秒）")
+    ap.add_argument("--jitter", type=float, default=0.0, help="额外随机延迟上限（秒）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="错误注入比例 0~1")
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--rate-limit", type=int, default=0, help="每个 key 每个窗口允许的请求数（0=不限）")
+    ap.add_argument("--rate-window", type=float, default=1.0, help="限流窗口（秒）")
+    ap.add_argument("--no-rate-headers", action="store_true", help="不回传 x-ratelimit-remaining-requests")
+    ap.add_argument("--pack-drop-every", type=int, default=0, help="打包请求中每 N 个条目丢弃/写坏一个（仅首次）")
+    args = ap.parse_args()
+
+    srv = StubLLMServer(args.host, args.port, args.latency, args.jitter,
+                        args.error_rate, args.error_status,
+                        rate_limit=args.rate_limit, rate_window=args.rate_window,
+                        pack_drop_every=args.pack_drop_every, rate_headers=not args.no_rate_headers)
+    print(f"[stub] listening on {srv.url}")
+    try:
+        srv._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# deadline_http.py
+# 带总时限（deadline）与可中断的 HTTP POST，供 DeepseekDualPromptComposer 使用。
+# - Deadline：一次节点调用的总预算，覆盖连接、读取与所有重试
+# - post_json()：在后台线程发请求，主线程轮询 ComfyUI 的中断标记与剩余预算；
+#   超时或中断时直接 shutdown 在途 socket，后台线程随即退出，不会卡住队列
+# - 429 / 5xx / 连接错误在预算内按指数退避重试（尊重 Retry-After）
+
+import socket
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import comfy.model_management as _mm  # ComfyUI 环境
+except Exception:  # 无头运行（batch_cli / 基准测试）
+    _mm = None
+
+POLL_INTERVAL_S = 0.1
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, budget_s: float):
+        self.budget = float(budget_s)
+        self.expires = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+def interrupted() -> bool:
+    """ComfyUI 的 Interrupt 按钮是否被按下（无头环境恒为 False）。"""
+    if _mm is None:
+        return False
+    try:
+        return bool(_mm.processing_interrupted())
+    except Exception:
+        return False
+
+
+def raise_if_interrupted():
+    """交给 ComfyUI 抛出 InterruptProcessingException（会同时清掉中断标记）。"""
+    if _mm is not None:
+        _mm.throw_exception_if_processing_interrupted()
+
+
+# ---------- 可强制断开的连接 ----------
+class _AbortableAdapter(HTTPAdapter):
+    """记录本适配器建立的所有连接，abort() 时直接 shutdown 底层 socket。"""
+
+    def __init__(self, *args, **kwargs):
+        self._conns = weakref.WeakSet()
+        self._conns_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _track(self, conn):
+        with self._conns_lock:
+            self._conns.add(conn)
+        return conn
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class _HTTPPool(HTTPConnectionPool):
+            def _new_conn(self):
+                return adapter._track(super()._new_conn())
+
+        class _HTTPSPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                return adapter._track(super()._new_conn())
+
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+    def abort(self):
+        with self._conns_lock:
+            conns = list(self._conns)
+        for conn in conns:
+            sock = getattr(conn, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _retry_after(resp, attempt: int) -> float:
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After", "")))
+    except (TypeError, ValueError):
+        return min(8.0, 0.5 * (2 ** attempt))
+
+
+def _attempt(session, adapter, url, headers, payload, deadline, connect_timeout, cancel_check):
+    """单次请求：后台线程阻塞在网络上，当前线程负责盯预算和中断。"""
+    box = {}
+    done = threading.Event()
+
+    def run():
+        try:
+            remaining = max(0.001, deadline.remaining())
+            box["resp"] = session.post(url, headers=headers, json=payload,
+                                       timeout=(min(connect_timeout, remaining), remaining))
+        except BaseException as e:  # noqa: BLE001 — 原样交回调用线程
+            box["exc"] = e
+        finally:
+            done.set()
+
+    t = threading.Thread(target=run, name="visiostar-http", daemon=True)
+    t.start()
+    while not done.wait(POLL_INTERVAL_S):
+        if cancel_check():
+            adapter.abort()
+            raise Cancelled("interrupted")
+        if deadline.expired():
+            adapter.abort()
+            raise DeadlineExceeded(f"deadline exceeded ({deadline.budget:.1f}s)")
+    if "exc" in box:
+        raise box["exc"]
+    return box["resp"]
+
+
+def _sleep(seconds: float, deadline: Deadline, cancel_check):
+    """退避 / 冷却等待同样受预算与中断约束。"""
+    end = time.monotonic() + min(seconds, deadline.remaining())
+    while time.monotonic() < end:
+        if cancel_check():
+            raise Cancelled("interrupted")
+        time.sleep(min(POLL_INTERVAL_S, max(0.0, end - time.monotonic())))
+
+
+def post_json(url: str, headers: dict, payload: dict, deadline: Deadline,
+              max_retries: int = 2, connect_timeout: float = 10.0, cancel_check=interrupted,
+              key_pool=None):
+    """
+    在 deadline 内 POST，可重试；返回最后一次的 Response（可能是非 200）。
+    预算耗尽抛 DeadlineExceeded，被中断抛 Cancelled。
+    key_pool（api_key_pool.ApiKeyPool）非空时每次尝试都重新选 key 并回报结果，
+    429 / 401 / 403 会立即换 key 重试。
+    退避（或等待 key 冷却）时间不短于剩余预算时不再等待：直接返回最后一次的 Response，
+    或重新抛出最后一次的网络错误，保留真实的失败原因而不是报「超时」。
+    """
+    session = requests.Session()
+    adapter = _AbortableAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    try:
+        attempt = switches = 0
+        last = None  # 最后一次的响应（非流式，内容已读完，close 后仍可返回）
+        while True:
+            if cancel_check():
+                raise Cancelled("interrupted")
+            if deadline.expired():
+                raise DeadlineExceeded(f"deadline exceeded ({deadline.budget:.1f}s)")
+
+            lease = key_pool.acquire() if key_pool is not None else None
+            if lease is not None:
+                wait_s = key_pool.ready_in(lease)
+                if last is not None and wait_s >= deadline.remaining():
+                    key_pool.release(lease, "cancelled")
+                    return last
+                try:
+                    _sleep(wait_s, deadline, cancel_check)
+                except BaseException:
+                    key_pool.release(lease, "cancelled")
+                    raise
+            hdrs = headers if lease is None else {**headers, "Authorization": f"Bearer {lease.key}"}
+            status, resp_headers, t0 = None, None, time.monotonic()
+            try:
+                resp = _attempt(session, adapter, url, hdrs, payload, deadline, connect_timeout, cancel_check)
+                status, resp_headers = resp.status_code, resp.headers
+            except (Cancelled, DeadlineExceeded):
+                status = "cancelled"
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if deadline.expired():
+                    status = "cancelled"
+                    raise DeadlineExceeded(f"deadline exceeded ({deadline.budget:.1f}s)") from e
+                last = None
+                wait_s = min(8.0, 0.5 * (2 ** attempt))
+                if attempt >= max_retries or wait_s >= deadline.remaining():
+                    raise
+            else:
+                # 有 key 池时 401/403 只说明这个 key 不可用，换一个 key 仍值得重试
+                switch_key = (key_pool is not None and len(key_pool) > 1
+                              and resp.status_code in (401, 403, 429))
+                if switch_key:
+                    # 换 key 不占用 max_retries，由总时限和 switches 上限约束
+                    if switches >= len(key_pool) * (max_retries + 1):
+                        return resp
+                    switches += 1
+                    resp.close()
+                    last = resp
+                    continue  # 出问题的 key 已被池子冷却/剔除，无需退避
+                if resp.status_code not in RETRY_STATUS or attempt >= max_retries:
+                    return resp
+                wait_s = _retry_after(resp, attempt)
+                if wait_s >= deadline.remaining():
+                    return resp
+                resp.close()
+                last = resp
+            finally:
+                if lease is not None:
+                    key_pool.release(lease, status, time.monotonic() - t0, resp_headers)
+
+            attempt += 1
+            _sleep(wait_s, deadline, cancel_check)
+    finally:
+        session.close()
@@ -0,0 +1,121 @@
+# latent_budget.py
+# latent 批量的内存估算与自动拆分（准入控制），供 AspectLatentSelector / SizeListLatentGenerator 使用。
+#
+# 内存模型（每张图，W×H 像素，latent = 4 × H/8 × W/8）：
+#   - latent：节点输出的 fp32 latent 本身
+#   - sample：采样阶段的峰值 ≈ latent + UNet 激活 + 解码后的 IMAGE（fp32，3×H×W）
+#     UNet 激活沿用 ComfyUI model_base.memory_required 的经验公式：
+#       latent 像素数 × CFG 双份 × dtype 字节 × 0.01 × memory_usage_factor × 1MiB
+# VAE 解码不计入：ComfyUI 解码时会按剩余显存自行分批 / 切块，采样阶段则无法拆分。
+# 估算是保守的经验值，用来把明显放不下的批量（如 64 × 4096²）拆成多个列表项，而不是精确预测。
+
+import math
+
+try:
+    import comfy.model_management as _mm  # ComfyUI 环境
+except Exception:  # 无头运行 / 基准测试
+    _mm = None
+
+LATENT_CHANNELS = 4
+LATENT_DTYPE_BYTES = 4   # 节点输出 fp32
+INFER_DTYPE_BYTES = 2    # 采样按 fp16 / bf16 估算
+CFG_BATCH = 2            # cond + uncond
+UNET_MEMORY_USAGE_FACTOR = 1.0  # ComfyUI 中 SD1.5 为 2.0、SDXL 为 0.8，取折中
+IMAGE_DTYPE_BYTES = 4    # 解码后的 IMAGE 为 fp32
+
+MB = 1024 * 1024
+
+
+def latent_hw(w: int, h: int):
+    return max(1, int(h) // 8), max(1, int(w) // 8)
+
+
+def estimate_bytes(w: int, h: int, batch: int = 1) -> dict:
+    """返回该尺寸 batch 张的估算字节数：{"latent": ..., "sample": ...}。"""
+    lh, lw = latent_hw(w, h)
+    latent_px = lh * lw
+    latent = LATENT_CHANNELS * latent_px * LATENT_DTYPE_BYTES
+    unet = latent_px * CFG_BATCH * INFER_DTYPE_BYTES * 0.01 * UNET_MEMORY_USAGE_FACTOR * MB
+    image = 3 * int(w) * int(h) * IMAGE_DTYPE_BYTES
+    b = max(1, int(batch))
+    return {"latent": int(latent * b), "sample": int((latent + unet + image) * b)}
+
+
+def _reserved_bytes(device) -> int:
+    """
+    -1 模式下要从空闲显存里扣掉的部分：
+      - ComfyUI 为推理保留的下限（minimum_inference_memory）
+      - 已登记、但有部分权重被卸载到内存的模型：采样时会搬回显存（model_offloaded_memory）
+    各版本 ComfyUI 的接口不完全一致，取不到的项按 0 处理。
+    """
+    reserved = 0
+    try:
+        reserved += int(_mm.minimum_inference_memory())
+    except Exception:
+        pass
+    for lm in list(getattr(_mm, "current_loaded_models", None) or []):
+        try:
+            if getattr(lm, "device", device) != device:
+                continue
+            if hasattr(lm, "model_offloaded_memory"):
+                reserved += max(0, int(lm.model_offloaded_memory()))
+            else:
+                reserved += max(0, int(lm.model_memory()) - int(lm.model_loaded_memory()))
+        except Exception:
+            continue
+    return reserved
+
+
+def resolve_budget(budget_mb: int) -> int:
+    """
+    预算（MB）→ 字节：0 = 不限制；-1 = 自动（无 ComfyUI 时不限制）。
+    自动预算 = 当前设备空闲显存 − 推理保留 − 已登记模型尚未驻留显存的部分，在节点构建时读取：
+    队列里第一次用到的模型此时还没加载，其权重无从计入——冷启动或换模型时请直接填 MB。
+    """
+    budget_mb = int(budget_mb or 0)
+    if budget_mb > 0:
+        return budget_mb * MB
+    if budget_mb < 0 and _mm is not None:
+        try:
+            device = _mm.get_torch_device()
+            free = int(_mm.get_free_memory(device))
+        except Exception:
+            return 0
+        # 扣完至少留 1 MiB，避免 0 被当成「不限制」
+        return max(MB, free - _reserved_bytes(device))
+    return 0
+
+
+def split_batch(w: int, h: int, batch: int, budget_bytes: int):
+    """
+    把 batch 拆成若干份，使每份的 sample 估算不超过预算；尽量均分（64 → [22, 21, 21]）。
+    预算为 0 时不拆分；单张就超预算时退化为每份 1 张。
+    """
+    batch = max(1, int(batch))
+    if budget_bytes <= 0:
+        return [batch]
+    per_image = estimate_bytes(w, h, 1)["sample"]
+    fit = max(1, budget_bytes // per_image)
+    if fit >= batch:
+        return [batch]
+    n = math.ceil(batch / fit)
+    base, extra = divmod(batch, n)
+    return [base + (1 if i < extra else 0) for i in range(n)]
+
+
+def _fmt(n: int) -> str:
+    return f"{n / (1024 ** 3):.2f} GiB" if n >= 1024 ** 3 else f"{n / MB:.1f} MiB"
+
+
+def describe_split(w: int, h: int, chunks, budget_bytes: int) -> str:
+    """split_plan 输出里的一行：尺寸、总张数、拆分结果、每张/每份估算与预算。"""
+    batch = sum(chunks)
+    per_image = estimate_bytes(w, h, 1)["sample"]
+    head = f"{w}x{h} ×{batch}"
+    if budget_bytes <= 0:
+        return f"{head} → 不拆分（未设预算），每张≈{_fmt(per_image)}"
+    line = (f"{head} → {len(chunks)} 份 {list(chunks)}，每张≈{_fmt(per_image)}，"
+            f"每份≈{_fmt(per_image * max(chunks))} / 预算 {_fmt(budget_bytes)}")
+    if per_image > budget_bytes:
+        line += "（单张已超预算）"
+    return line
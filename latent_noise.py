@@ -0,0 +1,82 @@
+# latent_noise.py
+# 带种子的高斯噪声 latent，供 AspectLatentSelector / SizeListLatentGenerator 使用。
+#
+# 每张图有自己的种子（基础种子 + 序号），同一种子总是得到同一张噪声，
+# 与批量大小、所在列表项以及按内存预算拆分的方式都无关。
+# 生成方式：整批一次性分配 [batch,4,H/8,W/8]，每张用自己的 CPU Generator，
+# 用 randn(out=samples[i]) 直接写进对应切片——没有逐张分配与 torch.cat 拷贝（峰值内存减半）；
+# 各张互不依赖，多核时按 torch.get_num_threads() 分给线程并行填充（torch 算子会释放 GIL）。
+# 结果与单独生成每一张（randn((1,4,H/8,W/8), generator=manual_seed(seed))）逐位一致。
+#
+# SeededNoise 是同一套噪声的 ComfyUI NOISE 对象（接 SamplerCustomAdvanced 的 noise 输入），
+# 由采样器按 sigma 缩放后加到 latent 上，EPS / v-pred / flow（Qwen-Image、Flux、SD3）模型都适用。
+
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+NOISE_MODES = ["zeros", "gaussian"]
+SEED_MAX = 0xFFFFFFFFFFFFFFFF  # 与 ComfyUI 的 seed 控件上限一致
+
+
+def item_seeds(base_seed: int, start: int, count: int):
+    """第 start..start+count-1 张图的种子（超过上限时回绕）。"""
+    return [(int(base_seed) + start + i) & SEED_MAX for i in range(count)]
+
+
+def _fill_rows(samples, seeds):
+    """samples[i] ← 以 seeds[i] 为种子的标准正态噪声（原地写入，多核时按行分给线程）。"""
+    batch = samples.shape[0]
+    row = tuple(samples.shape[1:])
+
+    def fill(rows):
+        g = torch.Generator(device="cpu")
+        for i in rows:
+            g.manual_seed(seeds[i])
+            torch.randn(row, generator=g, dtype=torch.float32, out=samples[i])
+
+    workers = min(batch, torch.get_num_threads())
+    if workers <= 1:
+        fill(range(batch))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="visiostar-noise") as ex:
+            list(ex.map(fill, [range(k, batch, workers) for k in range(workers)]))
+    return samples
+
+
+def make_latent(batch: int, channels: int, height: int, width: int, mode: str = "zeros", seeds=()):
+    """生成 [batch, channels, height, width] 的 fp32 CPU latent；gaussian 模式需要 batch 个种子。"""
+    if mode != "gaussian":
+        return torch.zeros((batch, channels, height, width), dtype=torch.float32, device="cpu")
+    if len(seeds) != batch:
+        raise ValueError(f"需要 {batch} 个种子，实际 {len(seeds)} 个")
+    samples = torch.empty((batch, channels, height, width), dtype=torch.float32, device="cpu")
+    return _fill_rows(samples, seeds)
+
+
+class SeededNoise:
+    """
+    ComfyUI NOISE 对象：第 i 张用种子 seed+i（latent 带 batch_index 时用 seed+batch_index[i]），
+    与 gaussian 模式 latent 里同一张图的噪声逐位一致。
+    形状（含通道数、视频的时间维）取自采样时实际的 latent，所以 16 通道的 Qwen-Image / Flux latent 也能用。
+    """
+
+    def __init__(self, seed: int):
+        self.seed = int(seed) & SEED_MAX
+
+    def generate_noise(self, input_latent):
+        samples = input_latent["samples"]
+        batch_index = input_latent.get("batch_index")
+        rows = range(samples.shape[0])
+        if batch_index is not None and len(batch_index) == len(rows):
+            rows = batch_index
+        seeds = [(self.seed + int(i)) & SEED_MAX for i in rows]
+        noise = torch.empty(tuple(samples.shape), dtype=torch.float32, device="cpu")
+        _fill_rows(noise, seeds)
+        return noise if samples.dtype == torch.float32 else noise.to(samples.dtype)
+
+
+def single_noise(channels: int, height: int, width: int, seed: int):
+    """单张参考实现（基准测试用它校验批量结果逐位一致）。"""
+    g = torch.Generator(device="cpu").manual_seed(seed)
+    return torch.randn((1, channels, height, width), generator=g, dtype=torch.float32)
@@ -0,0 +1,335 @@
+# profiling.py
+# 可选的节点性能埋点（默认关闭，开启后输出 Chrome trace-event JSON，可直接拖进 Perfetto / chrome://tracing 查看）
+#
+# 开启方式（启动 ComfyUI 前设置环境变量）：
+#   VISIOSTAR_PROFILE=1                      开启
+#   VISIOSTAR_PROFILE_MEM=1                  另外记录 tracemalloc 峰值（会拖慢同进程内所有 Python 分配）
+#   VISIOSTAR_PROFILE_DIR=/path/to/traces    trace 输出目录（默认：当前工作目录）
+#
+# 每个节点的 FUNCTION 由 @profile_node 包裹，记录：
+#   - wall / CPU 时间
+#   - 输出中张量占用的字节数
+#   - tracemalloc 峰值（Python 堆，仅 VISIOSTAR_PROFILE_MEM）：只在节点调用期间开启，最后一个在途调用结束即关闭；
+#     峰值是进程级的，调用期间有其他节点并发时只标记 mem_overlapped，不报告峰值
+# 节点内部用 span("http_wait") 之类的上下文标记子阶段。
+# 关闭时包装器只多一次布尔判断，span() 返回共享的空上下文。
+#
+# 落盘是增量的：trace 文件是一个 JSON 数组，每次只把上次落盘后的新事件追加到末尾，
+# 进程退出时补上结尾的 "]"（Perfetto / chrome://tracing 也能直接打开未闭合的数组）。
+# 内存里只缓存两次落盘之间的事件（MAX_PENDING_EVENTS），写盘跟不上时丢弃最旧的并记一条 events_dropped。
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+ENV_FLAG = "VISIOSTAR_PROFILE"
+ENV_MEM = "VISIOSTAR_PROFILE_MEM"
+ENV_DIR = "VISIOSTAR_PROFILE_DIR"
+MAX_PENDING_EVENTS = 10000  # 两次落盘之间最多缓存的事件数
+FLUSH_INTERVAL_S = 1.0  # 节点调用结束后最多每秒落盘一次
+
+
+def _env_on(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class _State:
+    def __init__(self):
+        self.enabled = _env_on(ENV_FLAG)
+        self.mem = _env_on(ENV_MEM)
+        self.path = None
+        self.events = deque(maxlen=MAX_PENDING_EVENTS)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # 串行化落盘；节点线程抢不到时直接跳过，不排队等 I/O
+        self.out_path = None  # 正在追加的 trace 文件（已写过数组开头）
+        self.local = threading.local()
+        self.t0 = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.last_flush = 0.0
+        # tracemalloc 引用计数：mem_users 为在途的最外层调用数，mem_entries 用于判断调用期间是否有并发
+        self.mem_users = 0
+        self.mem_entries = 0
+        self.mem_started = False
+
+
+_STATE = _State()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled() -> bool:
+    return _STATE.enabled
+
+
+def mem_enabled() -> bool:
+    return _STATE.mem
+
+
+def enable(path: str = None, mem: bool = None):
+    """
+    运行时开启（基准测试/脚本用）；path 为 trace 文件路径，None 则按环境变量决定；
+    mem 控制是否记录 tracemalloc 峰值，None 则按 VISIOSTAR_PROFILE_MEM。
+    """
+    _STATE.enabled = True
+    if path:
+        _STATE.path = path
+    if mem is not None:
+        _STATE.mem = bool(mem)
+
+
+def disable():
+    _STATE.enabled = False
+
+
+def trace_path() -> str:
+    if _STATE.path:
+        return _STATE.path
+    out_dir = os.environ.get(ENV_DIR) or os.getcwd()
+    return os.path.join(out_dir, f"visiostar_trace_{_STATE.pid}.json")
+
+
+def _now_us() -> float:
+    return (time.perf_counter_ns() - _STATE.t0) / 1000.0
+
+
+def _stack():
+    st = getattr(_STATE.local, "stack", None)
+    if st is None:
+        st = _STATE.local.stack = []
+    return st
+
+
+def _mem_enter():
+    """最外层调用开始：必要时开启 tracemalloc；返回 (本次序号, 起始内存, 开始时是否独占)。"""
+    with _STATE.lock:
+        alone = _STATE.mem_users == 0
+        if alone:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _STATE.mem_started = True
+            tracemalloc.reset_peak()
+        _STATE.mem_users += 1
+        _STATE.mem_entries += 1
+        return _STATE.mem_entries, tracemalloc.get_traced_memory()[0], alone
+
+
+def _mem_exit(entry: int, mem0: int, alone: bool):
+    """最外层调用结束：返回独占期间的峰值（有并发时为 None）；由本模块开启的 tracemalloc 在最后一个调用结束时关闭。"""
+    with _STATE.lock:
+        # 开始时没有其他调用在途、期间也没有新调用进入，峰值才只属于本次调用
+        exclusive = alone and _STATE.mem_users == 1 and _STATE.mem_entries == entry
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        _STATE.mem_users -= 1
+        if _STATE.mem_users == 0 and _STATE.mem_started:
+            tracemalloc.stop()
+            _STATE.mem_started = False
+    return int(max(0, peak - mem0)) if exclusive else None
+
+
+def _tensor_bytes(obj, _depth: int = 0) -> int:
+    # 鸭子类型识别张量，避免在这里 import torch
+    if hasattr(obj, "element_size") and hasattr(obj, "nelement"):
+        return int(obj.element_size() * obj.nelement())
+    if _depth > 6:
+        return 0
+    if isinstance(obj, dict):
+        return sum(_tensor_bytes(v, _depth + 1) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_tensor_bytes(v, _depth + 1) for v in obj)
+    return 0
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "ts", "cpu0")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        _stack().append(self)
+        self.ts = _now_us()
+        self.cpu0 = time.thread_time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = _now_us() - self.ts
+        self.args["cpu_ms"] = round((time.thread_time_ns() - self.cpu0) / 1e6, 3)
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        st = _stack()
+        if st and st[-1] is self:
+            st.pop()
+        _emit({
+            "name": self.name, "cat": self.cat, "ph": "X",
+            "ts": round(self.ts, 3), "dur": round(dur, 3),
+            "pid": _STATE.pid, "tid": threading.get_ident(),
+            "args": self.args,
+        })
+        return False
+
+
+def _emit(event: dict):
+    with _STATE.lock:
+        if len(_STATE.events) == MAX_PENDING_EVENTS:
+            _STATE.dropped += 1
+        _STATE.events.append(event)
+
+
+def span(name: str, **args):
+    """子阶段埋点：with span("http_wait", url=url): ..."""
+    if not _STATE.enabled:
+        return _NULL_SPAN
+    return _Span(name, "span", args)
+
+
+def _append_pending(path: str):
+    """把缓存的新事件追加到 path（调用方持有 flush_lock）；换了文件或 clear() 之后重新写数组开头。"""
+    with _STATE.lock:
+        events = list(_STATE.events)
+        _STATE.events.clear()
+        dropped, _STATE.dropped = _STATE.dropped, 0
+    if dropped:
+        events.append({
+            "name": "events_dropped", "ph": "i", "s": "p", "ts": round(_now_us(), 3),
+            "pid": _STATE.pid, "tid": 0, "args": {"count": dropped},
+        })
+    fresh = _STATE.out_path != path
+    chunks = []
+    if fresh:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        chunks.append("[\n" + json.dumps({
+            "name": "process_name", "ph": "M", "pid": _STATE.pid, "tid": 0,
+            "args": {"name": "VisioStar nodes"},
+        }))
+    chunks.extend(",\n" + json.dumps(e, ensure_ascii=False) for e in events)
+    _STATE.out_path = None
+    with open(path, "w" if fresh else "a", encoding="utf-8") as f:
+        f.write("".join(chunks))
+    _STATE.out_path = path
+
+
+def write_trace(path: str = None) -> str:
+    """把缓存的新事件追加到 trace 文件（未闭合的 JSON 数组），返回文件路径；用 read_trace() 读取。"""
+    path = path or trace_path()
+    with _STATE.flush_lock:
+        _append_pending(path)
+    return path
+
+
+def read_trace(path: str = None) -> list:
+    """读取 trace 文件，兼容进程仍在运行、数组尚未闭合的情况；返回事件列表。"""
+    with open(path or trace_path(), encoding="utf-8") as f:
+        text = f.read().rstrip()
+    if not text.endswith("]"):
+        text += "\n]"
+    return json.loads(text)
+
+
+def _flush(block: bool = True):
+    if not _STATE.events and not _STATE.dropped:
+        return
+    if not _STATE.flush_lock.acquire(blocking=block):
+        return  # 另一个线程正在落盘，这批事件留给下一次
+    try:
+        _append_pending(trace_path())
+    except OSError as e:
+        print(f"[VisioStar profiling] 写入 trace 失败: {e}")
+    finally:
+        _STATE.flush_lock.release()
+
+
+def _maybe_flush():
+    now = time.monotonic()
+    if now - _STATE.last_flush >= FLUSH_INTERVAL_S:
+        _STATE.last_flush = now
+        _flush(block=False)
+
+
+def _finish():
+    """进程退出：写完剩余事件并闭合数组。"""
+    _flush()
+    with _STATE.flush_lock:
+        if _STATE.out_path:
+            try:
+                with open(_STATE.out_path, "a", encoding="utf-8") as f:
+                    f.write("\n]\n")
+            except OSError:
+                pass
+            _STATE.out_path = None
+
+
+atexit.register(_finish)
+
+
+def clear():
+    """丢弃缓存的事件；下次落盘重新开始一个文件（覆盖原文件）。"""
+    with _STATE.flush_lock, _STATE.lock:
+        _STATE.events.clear()
+        _STATE.dropped = 0
+        _STATE.out_path = None
+
+
+def profile_node(name: str):
+    """
+    节点 FUNCTION 装饰器。最外层调用结束后按 FLUSH_INTERVAL_S 节流、增量落盘，
+    ComfyUI 进程不一定能正常退出，所以不单靠 atexit。
+    """
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _STATE.enabled:
+                return fn(*args, **kwargs)
+
+            top = not _stack()
+            mem = top and _STATE.mem
+            if mem:
+                entry, mem0, alone = _mem_enter()
+
+            try:
+                with _Span(name, "node", {}) as sp:
+                    try:
+                        result = fn(*args, **kwargs)
+                        sp.set(tensor_bytes=_tensor_bytes(result))
+                    finally:
+                        if mem:
+                            peak = _mem_exit(entry, mem0, alone)
+                            if peak is None:
+                                sp.set(mem_overlapped=True)
+                            else:
+                                sp.set(tracemalloc_peak_bytes=peak)
+                return result
+            finally:
+                if top:
+                    _maybe_flush()
+
+        return wrapper
+
+    return deco